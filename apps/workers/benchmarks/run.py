@@ -0,0 +1,375 @@
+"""
+Storyboard AI Workers - End-to-end benchmark suite
+
+Runs the FastAPI app in-process and real Worker instances against a
+local Redis, with the stub image backend and an optional simulated LLM,
+and writes machine-readable results for comparison between releases.
+
+Usage (from apps/workers):
+    python benchmarks/run.py --redis-url redis://localhost:6379/15
+    python benchmarks/run.py --fake-redis   # needs fakeredis[lua]
+
+The Redis database given is FLUSHED before every stage, so point it at
+a dedicated database.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def configure(args: argparse.Namespace):
+    """Point settings at the benchmark environment before src is imported"""
+    os.environ.update({
+        "REDIS_URL": args.redis_url,
+        "IMAGE_BACKEND": "stub",
+        "STUB_LATENCY_SECONDS": str(args.stub_latency),
+        "STUB_LATENCY_JITTER_SECONDS": "0",
+        "STUB_ERROR_RATE": "0",
+        "STORAGE_BACKEND": "none",
+        "STORAGE_LOCAL_PATH": str(ROOT / "benchmarks" / ".media"),
+        "RESULT_CACHE_ENABLED": "false",
+        "ADMISSION_MAX_WAIT_SECONDS": "0",
+        # Measure the pipeline, not the provider limits
+        "RATE_LIMIT_ENABLED": "false",
+        "WORKER_METRICS_PORT": "0",
+        "OPENAI_API_KEY": "",
+    })
+    sys.path.insert(0, str(ROOT / "src"))
+
+
+def percentiles(samples: list[float]) -> dict:
+    """Summarize latencies in milliseconds"""
+    if len(samples) < 2:
+        value = samples[0] * 1000 if samples else None
+        return {"count": len(samples), "p50_ms": value, "p95_ms": value, "p99_ms": value}
+    
+    cuts = statistics.quantiles(samples, n=100)
+    return {
+        "count": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": cuts[49] * 1000,
+        "p95_ms": cuts[94] * 1000,
+        "p99_ms": cuts[98] * 1000,
+    }
+
+
+async def timed_requests(send, count: int, concurrency: int) -> dict:
+    """Run `send(i)` count times with bounded concurrency"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+    
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await send(i)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    elapsed = time.perf_counter() - started
+    
+    return {
+        "requests": count,
+        "concurrency": concurrency,
+        "errors": errors,
+        "seconds": elapsed,
+        "requests_per_second": count / elapsed,
+        "latency": percentiles(latencies),
+    }
+
+
+def scene(i: int, project_id: str = "bench") -> dict:
+    """A unique generation request body"""
+    return {
+        "scene_id": f"scene-{i}",
+        "project_id": project_id,
+        "prompt": f"Benchmark scene number {i}, a lighthouse on a cliff at dusk",
+    }
+
+
+class FakeLLM:
+    """AsyncOpenAI stand-in that answers after a fixed delay"""
+    
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+    
+    async def _create(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        content = f"enhanced: {kwargs['messages'][-1]['content'][:200]}"
+        if kwargs.get("response_format"):
+            count = kwargs["messages"][-1]["content"].count("Style:")
+            content = json.dumps({"prompts": [content] * count})
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))]
+        )
+    
+    async def close(self):
+        pass
+
+
+async def reset(queue_manager):
+    """Start a stage from an empty database"""
+    if not queue_manager.redis:
+        await queue_manager.connect()
+    await queue_manager.redis.flushdb()
+    queue_manager._job_cache.clear()
+    queue_manager._stats = None
+
+
+async def bench_enqueue(client, queue_manager, args) -> dict:
+    """Throughput of single and batch generation enqueue"""
+    await reset(queue_manager)
+    single = await timed_requests(
+        lambda i: client.post("/api/generation/image", json=scene(i)),
+        args.jobs,
+        args.http_concurrency,
+    )
+    
+    await reset(queue_manager)
+    batch_size = 50
+    batches = max(1, args.jobs // batch_size)
+    batch = await timed_requests(
+        lambda i: client.post(
+            "/api/generation/batch",
+            json={"items": [scene(i * batch_size + j) for j in range(batch_size)]},
+        ),
+        batches,
+        args.http_concurrency,
+    )
+    batch["jobs_per_second"] = batch["requests_per_second"] * batch_size
+    
+    return {"single": single, "batch": batch}
+
+
+async def bench_worker(client, queue_manager, args) -> list[dict]:
+    """Dequeue-to-complete throughput for each worker concurrency"""
+    from worker import Worker
+    
+    results = []
+    for concurrency in args.worker_concurrency:
+        await reset(queue_manager)
+        response = await client.post(
+            "/api/generation/batch",
+            json={"items": [scene(i) for i in range(args.jobs)]},
+        )
+        job_ids = response.json()["job_ids"]
+        
+        worker = Worker(concurrency=concurrency)
+        started = time.perf_counter()
+        run = asyncio.create_task(worker.run())
+        
+        # The worker shares queue_manager, wait for it to connect
+        while not queue_manager.redis:
+            await asyncio.sleep(0.05)
+        
+        pending = set(job_ids)
+        while pending and time.perf_counter() - started < args.timeout:
+            async with queue_manager.redis.pipeline(transaction=False) as pipe:
+                for job_id in pending:
+                    pipe.get(f"job:{job_id}")
+                records = await pipe.execute()
+            for job_id, record in zip(list(pending), records):
+                if record and json.loads(record)["status"] in ("completed", "failed"):
+                    pending.discard(job_id)
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        
+        worker.shutdown()
+        await run
+        
+        completed = len(job_ids) - len(pending)
+        results.append({
+            "concurrency": concurrency,
+            "jobs": len(job_ids),
+            "completed": completed,
+            "timed_out": bool(pending),
+            "seconds": elapsed,
+            "jobs_per_second": completed / elapsed,
+            "ideal_jobs_per_second": concurrency / args.stub_latency if args.stub_latency else None,
+        })
+    
+    # Worker.run disconnects the shared queue manager on exit
+    await queue_manager.connect()
+    return results
+
+
+async def bench_prompts(client, queue_manager, args) -> dict:
+    """Latency of /api/prompts/enhance, template path and simulated LLM"""
+    from services import prompt_engineer
+    
+    def body(i: int) -> dict:
+        return {"scene_description": f"A quiet harbor town at dawn, scene {i}", "style": "cinematic"}
+    
+    results = {}
+    await reset(queue_manager)
+    results["template"] = await timed_requests(
+        lambda i: client.post("/api/prompts/enhance", json=body(i)),
+        args.requests,
+        1,
+    )
+    
+    if args.llm_latency:
+        prompt_engineer._client = FakeLLM(args.llm_latency)
+        prompt_engineer._prompt_cache.clear()
+        await reset(queue_manager)
+        
+        results["llm_cold"] = await timed_requests(
+            lambda i: client.post("/api/prompts/enhance", json=body(i)),
+            args.requests,
+            args.http_concurrency,
+        )
+        results["llm_cached"] = await timed_requests(
+            lambda i: client.post("/api/prompts/enhance", json=body(i)),
+            args.requests,
+            args.http_concurrency,
+        )
+        
+        prompt_engineer._prompt_cache.clear()
+        await reset(queue_manager)
+        batch_size = 40
+        results["llm_batch"] = await timed_requests(
+            lambda i: client.post(
+                "/api/prompts/enhance/batch",
+                json={"items": [body(i * batch_size + j) for j in range(batch_size)]},
+            ),
+            max(1, args.requests // batch_size),
+            1,
+        )
+        results["llm_batch"]["scenes_per_request"] = batch_size
+        prompt_engineer._client = None
+    
+    return results
+
+
+async def bench_status(client, queue_manager, args) -> dict:
+    """Cost of job status polls for pending and finished jobs"""
+    await reset(queue_manager)
+    response = await client.post("/api/generation/image", json=scene(0))
+    pending_id = response.json()["job_id"]
+    response = await client.post("/api/generation/image", json=scene(1))
+    finished_id = response.json()["job_id"]
+    await queue_manager.update_job_status(finished_id, "completed", image_url="stub://done")
+    
+    return {
+        "pending": await timed_requests(
+            lambda i: client.get(f"/api/generation/job/{pending_id}"),
+            args.requests,
+            args.http_concurrency,
+        ),
+        "finished": await timed_requests(
+            lambda i: client.get(f"/api/generation/job/{finished_id}"),
+            args.requests,
+            args.http_concurrency,
+        ),
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+async def main(args: argparse.Namespace):
+    configure(args)
+    
+    import httpx
+    
+    if args.fake_redis:
+        import fakeredis.aioredis
+        import redis.asyncio as redis
+        
+        server = fakeredis.FakeServer()
+        
+        def fake_pool(*pool_args, **kwargs):
+            return redis.BlockingConnectionPool(
+                connection_class=fakeredis.aioredis.FakeConnection,
+                server=server,
+                decode_responses=True,
+                max_connections=kwargs.get("max_connections", 50),
+            )
+        
+        redis.BlockingConnectionPool.from_url = staticmethod(fake_pool)
+    
+    from main import app
+    from services.queue_manager import queue_manager
+    
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "redis": "fakeredis" if args.fake_redis else args.redis_url,
+            "params": {k: v for k, v in vars(args).items() if k != "output"},
+        },
+    }
+    
+    async with app.router.lifespan_context(app):
+        if not queue_manager.redis:
+            raise SystemExit(f"Redis is not reachable at {args.redis_url}")
+        
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            stages = {
+                "enqueue": bench_enqueue,
+                "worker": bench_worker,
+                "prompts": bench_prompts,
+                "status": bench_status,
+            }
+            for name, stage in stages.items():
+                if args.only and name not in args.only:
+                    continue
+                print(f"▶ {name}...", flush=True)
+                results[name] = await stage(client, queue_manager, args)
+        
+        await queue_manager.redis.flushdb()
+    
+    output = Path(args.output or ROOT / "benchmarks" / "results" / f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(json.dumps(results, indent=2))
+    print(f"📄 Results written to {output}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--fake-redis", action="store_true", help="Use in-process fakeredis")
+    parser.add_argument("--jobs", type=int, default=200, help="Jobs per enqueue/worker stage")
+    parser.add_argument("--requests", type=int, default=400, help="Requests per latency stage")
+    parser.add_argument("--http-concurrency", type=int, default=16)
+    parser.add_argument("--worker-concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--stub-latency", type=float, default=0.2, help="Seconds per stub prediction")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds per simulated LLM call (0 skips)")
+    parser.add_argument("--timeout", type=float, default=300, help="Max seconds per worker run")
+    parser.add_argument("--only", nargs="+", choices=["enqueue", "worker", "prompts", "status"])
+    parser.add_argument("--output", help="Results file (default benchmarks/results/<timestamp>.json)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
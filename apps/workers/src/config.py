@@ -16,14 +16,68 @@ class Settings(BaseSettings):
     redis_url: str = "redis://localhost:6379"
     redis_host: str = "localhost"
     redis_port: int = 6379
+    redis_max_connections: int = 50
+    redis_pool_timeout_seconds: float = 5.0
+    redis_connect_timeout_seconds: float = 2.0
+    # Reply timeout on open connections, so a stalled Redis fails fast (the
+    # worker adds its blocking pop time on top)
+    redis_socket_timeout_seconds: float = 2.0
+    redis_reconnect_base_seconds: float = 0.5
+    redis_reconnect_max_seconds: float = 30.0
+    
+    # Image backend: "replicate" or "stub" (local placeholders for load tests)
+    image_backend: str = "replicate"
+    stub_latency_seconds: float = 2.0
+    stub_latency_jitter_seconds: float = 0.5
+    stub_error_rate: float = 0.0
     
     # Replicate (Image Generation)
     replicate_api_key: Optional[str] = None
     replicate_model_version: str = "sdxl-1.0"
+    replicate_poll_interval_seconds: float = 0.5
+    replicate_poll_max_interval_seconds: float = 3.0
+    replicate_request_timeout_seconds: float = 30.0
+    replicate_max_connections: int = 20
     
     # OpenAI (Prompt Processing)
     openai_api_key: Optional[str] = None
     openai_model: str = "gpt-4o-mini"
+    openai_timeout_seconds: float = 30.0
+    
+    # Provider rate limits, shared by all workers and API pods through Redis
+    # (requests per second with a burst allowance, and concurrent calls;
+    # 0 disables a limit)
+    rate_limit_enabled: bool = True
+    rate_limit_lease_seconds: float = 600.0
+    replicate_requests_per_second: float = 10.0
+    replicate_burst: int = 20
+    replicate_max_concurrent: int = 0
+    openai_requests_per_second: float = 8.0
+    openai_burst: int = 16
+    openai_max_concurrent: int = 0
+    
+    # LLM circuit breaker and latency budget of prompt enhancement
+    # (past the budget the template prompt is served; a hedged duplicate
+    # request is sent after `prompt_hedge_after_seconds`, 0 disables)
+    llm_breaker_failure_threshold: int = 5
+    llm_breaker_slow_call_seconds: float = 5.0
+    llm_breaker_reset_seconds: float = 30.0
+    prompt_latency_budget_seconds: float = 3.0
+    prompt_hedge_after_seconds: float = 0.0
+    
+    # Character references, registered once per project
+    character_cache_size: int = 256
+    character_ttl_seconds: int = 30 * 86400
+    character_reference_max_bytes: int = 10 * 1024 * 1024
+    
+    # Prompt enhancement cache
+    prompt_cache_size: int = 2048
+    prompt_cache_ttl_seconds: int = 86400
+    
+    # Batch prompt enhancement
+    prompt_batch_concurrency: int = 5
+    prompt_pack_size: int = 5
+    prompt_pack_max_chars: int = 300
     
     # Supabase
     supabase_url: Optional[str] = None
@@ -32,7 +86,51 @@ class Settings(BaseSettings):
     # Generation Settings
     max_concurrent_generations: int = 3
     generation_timeout_seconds: int = 60
+    max_concurrent_upscales: int = 1
+    upscale_timeout_seconds: int = 120
     max_retries: int = 3
+    retry_backoff_base_seconds: float = 2.0
+    retry_backoff_max_seconds: float = 60.0
+    
+    # Reliable queue (in-flight tracking and crash recovery)
+    reliable_queue: bool = True
+    worker_heartbeat_interval_seconds: float = 10.0
+    worker_heartbeat_ttl_seconds: int = 30
+    
+    # Scheduling: interactive jobs dispatched per bulk job when both wait
+    interactive_lane_weight: int = 4
+    
+    # Admission control: reject new jobs (429) once the estimated wait in
+    # their lane exceeds this many seconds (0 disables)
+    admission_max_wait_seconds: float = 0
+    queue_stats_max_age_seconds: float = 2.0
+    
+    # Result cache. Entries pointing at Replicate delivery URLs (nothing
+    # mirrored to object storage) must expire before those URLs do, about
+    # an hour after the prediction
+    result_cache_enabled: bool = True
+    result_cache_ttl_seconds: int = 3600
+    result_cache_unmirrored_ttl_seconds: int = 2400
+    result_cache_max_entries: int = 10000
+    
+    # Object storage for generated images: "none", "local" or "s3"
+    storage_backend: str = "none"
+    storage_local_path: str = "./media"
+    # Defaults to the API's /media mount for "local", the bucket URL for "s3"
+    storage_public_url: Optional[str] = None
+    s3_bucket: Optional[str] = None
+    s3_endpoint_url: Optional[str] = None
+    s3_region: Optional[str] = None
+    s3_access_key_id: Optional[str] = None
+    s3_secret_access_key: Optional[str] = None
+    
+    # Image post-processing
+    postprocess_threads: int = 2
+    thumbnail_max_size: int = 384
+    webp_quality: int = 80
+    
+    # Metrics (Prometheus exporter port for the worker process, 0 disables)
+    worker_metrics_port: int = 9100
     
     # Debug
     debug_ai: bool = False
@@ -8,9 +8,12 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 
 from config import settings
-from routers import generation, prompts, health
+from routers import characters, generation, prompts, health
+from services import image_backends, postprocess, prompt_engineer
+from services.queue_manager import queue_manager
 
 # Configure logging
 logging.basicConfig(
@@ -27,8 +30,14 @@ async def lifespan(app: FastAPI):
     logger.info(f"📍 API URL: {settings.api_url}")
     logger.info(f"🤖 Replicate enabled: {bool(settings.replicate_api_key)}")
     logger.info(f"🧠 OpenAI enabled: {bool(settings.openai_api_key)}")
+    await queue_manager.connect()
+    prompt_engineer.init_client()
     yield
     logger.info("👋 Shutting down Storyboard AI Workers...")
+    await image_backends.close_client()
+    await prompt_engineer.close_client()
+    await postprocess.close_client()
+    await queue_manager.disconnect()
 
 
 app = FastAPI(
@@ -51,6 +60,15 @@ app.add_middleware(
 app.include_router(health.router, tags=["health"])
 app.include_router(generation.router, prefix="/api/generation", tags=["generation"])
 app.include_router(prompts.router, prefix="/api/prompts", tags=["prompts"])
+app.include_router(characters.router, prefix="/api/characters", tags=["characters"])
+
+# Serve mirrored images and stub placeholders when they are stored locally
+if settings.storage_backend == "local" or settings.image_backend == "stub":
+    app.mount(
+        "/media",
+        StaticFiles(directory=settings.storage_local_path, check_dir=False),
+        name="media",
+    )
 
 
 @app.get("/")
@@ -0,0 +1,97 @@
+"""
+Character router - Register recurring characters of a storyboard
+"""
+
+import logging
+from typing import Optional
+
+import httpx
+from fastapi import APIRouter, HTTPException, Path
+from pydantic import BaseModel, Field
+from redis.exceptions import RedisError
+
+from services.character_store import (
+    ID_PATTERN,
+    ReferenceImageError,
+    get_character,
+    register_character,
+)
+from services.queue_manager import QueueUnavailableError, queue_manager
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+class CharacterRequest(BaseModel):
+    project_id: str = Field(..., pattern=ID_PATTERN)
+    name: str = Field(..., min_length=1, max_length=100)
+    description: Optional[str] = Field(None, max_length=1000)
+    reference_image_url: Optional[str] = None
+    embedding: Optional[str] = None
+
+
+class CharacterResponse(BaseModel):
+    character_id: str
+    project_id: str
+    name: str
+    description: Optional[str] = None
+    reference_image_url: Optional[str] = None
+
+
+def _response(character: dict) -> CharacterResponse:
+    return CharacterResponse(
+        character_id=character["id"],
+        project_id=character["project_id"],
+        name=character["name"],
+        description=character.get("description"),
+        reference_image_url=character.get("reference_image_url"),
+    )
+
+
+@router.post("", response_model=CharacterResponse)
+async def create_character(request: CharacterRequest):
+    """
+    Register a character once per project
+    
+    Pass the returned `character_id` with generation requests of the
+    same project instead of the character data.
+    """
+    try:
+        character = await register_character(
+            project_id=request.project_id,
+            name=request.name,
+            description=request.description,
+            reference_image_url=request.reference_image_url,
+            embedding=request.embedding,
+        )
+        return _response(character)
+    except (QueueUnavailableError, RedisError) as e:
+        logger.error(f"Character store unavailable: {e}")
+        raise HTTPException(status_code=503, detail="Character store unavailable")
+    except ReferenceImageError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=422, detail=f"Failed to fetch reference image: {e}")
+    except Exception as e:
+        logger.error(f"Failed to register character: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{project_id}/{character_id}", response_model=CharacterResponse)
+async def read_character(
+    project_id: str = Path(..., pattern=ID_PATTERN),
+    character_id: str = Path(..., pattern=ID_PATTERN),
+):
+    """
+    Get a registered character
+    """
+    await queue_manager.ensure_connected()
+    try:
+        character = await get_character(project_id, character_id)
+    except (QueueUnavailableError, RedisError) as e:
+        logger.error(f"Character store unavailable: {e}")
+        raise HTTPException(status_code=503, detail="Character store unavailable")
+    if not character:
+        raise HTTPException(status_code=404, detail="Character not found")
+    return _response(character)
@@ -3,12 +3,22 @@ Image generation router
 """
 
 import logging
+import math
 from typing import Optional
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
+from redis.exceptions import RedisError
 
+from config import settings
+from services.character_store import ID_PATTERN, get_character
 from services.image_generator import generate_image
-from services.queue_manager import queue_generation_job
+from services.queue_manager import (
+    QueueUnavailableError,
+    queue_generation_job,
+    queue_generation_jobs,
+    queue_manager,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -17,11 +27,27 @@ router = APIRouter()
 
 class GenerateImageRequest(BaseModel):
     scene_id: str
+    project_id: Optional[str] = Field(None, pattern=ID_PATTERN)
+    user_id: Optional[str] = None
     prompt: str = Field(..., min_length=10)
     negative_prompt: Optional[str] = None
     style: str = "cinematic"
     aspect_ratio: str = "16:9"
-    character_embedding: Optional[str] = None
+    # Registered with POST /api/characters for the same project
+    character_id: Optional[str] = Field(None, pattern=ID_PATTERN)
+    seed: Optional[int] = None
+    force_regenerate: bool = False
+    # Images generated by one prediction, to pick from
+    variants: int = Field(1, ge=1, le=4)
+    # Queue an upscale of the first image once generated (final export)
+    upscale: bool = False
+
+
+class UpscaleImageRequest(BaseModel):
+    image_url: str
+    scene_id: Optional[str] = None
+    project_id: Optional[str] = Field(None, pattern=ID_PATTERN)
+    user_id: Optional[str] = None
 
 
 class GenerateImageResponse(BaseModel):
@@ -30,13 +56,158 @@ class GenerateImageResponse(BaseModel):
     message: str
 
 
+class BatchGenerateImageRequest(BaseModel):
+    items: list[GenerateImageRequest] = Field(..., min_length=1, max_length=200)
+
+
+class BatchGenerateImageResponse(BaseModel):
+    job_ids: list[str]
+    status: str
+    message: str
+
+
+class QueueStats(BaseModel):
+    depth: dict[str, int]
+    waiting: int
+    in_flight: int
+    workers: int
+    capacity: int
+    avg_job_seconds: Optional[float] = None
+    estimated_wait_seconds: dict[str, Optional[float]]
+
+
+class GenerationResult(BaseModel):
+    image_url: str
+    webp_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    seed: Optional[int] = None
+    index: int = 0
+
+
 class GenerationStatus(BaseModel):
     job_id: str
     status: str
+    type: str = "generate"
+    scene_id: Optional[str] = None
     image_url: Optional[str] = None
+    webp_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    upscaled_url: Optional[str] = None
+    results: list[GenerationResult] = []
+    upscale_job_id: Optional[str] = None
+    upscale_error: Optional[str] = None
+    superseded_by: Optional[str] = None
     error_message: Optional[str] = None
 
 
+def _job_payload(request: GenerateImageRequest, lane: str) -> dict:
+    """
+    Build the queued job payload for a generation request
+    
+    The lane is chosen by the endpoint, never by the client, so a large
+    batch cannot claim the interactive lane.
+    """
+    return {
+        "type": "generate",
+        "scene_id": request.scene_id,
+        "project_id": request.project_id,
+        "user_id": request.user_id,
+        "priority": lane,
+        "prompt": request.prompt,
+        "negative_prompt": request.negative_prompt,
+        "style": request.style,
+        "aspect_ratio": request.aspect_ratio,
+        "character_id": request.character_id,
+        "seed": request.seed,
+        "force_regenerate": request.force_regenerate,
+        "variants": request.variants,
+        "upscale": request.upscale,
+    }
+
+
+def _job_status(job: dict) -> GenerationStatus:
+    """Public view of a stored job record"""
+    return GenerationStatus(
+        job_id=job["id"],
+        status=job["status"],
+        type=job.get("type", "generate"),
+        scene_id=job.get("scene_id"),
+        image_url=job.get("image_url"),
+        webp_url=job.get("webp_url"),
+        thumbnail_url=job.get("thumbnail_url"),
+        upscaled_url=job.get("upscaled_url"),
+        results=job.get("results", []),
+        upscale_job_id=job.get("upscale_job_id"),
+        upscale_error=job.get("upscale_error"),
+        superseded_by=job.get("superseded_by"),
+        error_message=job.get("error_message"),
+    )
+
+
+async def check_admission(lanes: set[str]):
+    """
+    Reject new work with 429 while the estimated wait is too long
+    
+    Raises:
+        HTTPException: 429 with Retry-After when a lane is over the limit
+    """
+    if not settings.admission_max_wait_seconds:
+        return
+    
+    try:
+        stats = await queue_manager.queue_stats(max_age=settings.queue_stats_max_age_seconds)
+    except Exception as e:
+        # Never refuse work just because the estimate is unavailable
+        logger.warning(f"Queue stats unavailable, admitting job: {e}")
+        return
+    
+    # Without live workers a backlog never drains, however short it is
+    if stats.get("waiting") and not stats.get("capacity"):
+        raise HTTPException(
+            status_code=429,
+            detail="Generation queue has a backlog and no workers",
+            headers={"Retry-After": str(math.ceil(settings.admission_max_wait_seconds))},
+        )
+    
+    waits = [
+        stats.get("estimated_wait_seconds", {}).get(lane) for lane in lanes
+    ]
+    wait = max((w for w in waits if w is not None), default=None)
+    if wait is not None and wait > settings.admission_max_wait_seconds:
+        retry_after = math.ceil(wait - settings.admission_max_wait_seconds)
+        raise HTTPException(
+            status_code=429,
+            detail=f"Generation queue is busy, estimated wait {wait:.0f}s",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+async def check_characters(requests: list[GenerateImageRequest]):
+    """
+    Make sure every referenced character is registered for its project
+    
+    Raises:
+        HTTPException: 422 for an unknown character, 503 while the
+            character store is unavailable
+    """
+    if not queue_manager.redis:
+        return
+    
+    for project_id, character_id in {
+        (r.project_id, r.character_id) for r in requests if r.character_id
+    }:
+        try:
+            character = project_id and await get_character(project_id, character_id)
+        except (QueueUnavailableError, RedisError) as e:
+            logger.error(f"Character store unavailable: {e}")
+            raise HTTPException(status_code=503, detail="Character store unavailable")
+        if not character:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Unknown character {character_id} in project {project_id}",
+            )
+
+
 @router.post("/image", response_model=GenerateImageResponse)
 async def create_generation_job(
     request: GenerateImageRequest,
@@ -45,16 +216,14 @@ async def create_generation_job(
     """
     Queue an image generation job
     """
+    # Single-scene requests are interactive regenerations
+    payload = _job_payload(request, "interactive")
+    await check_characters([request])
+    await check_admission({payload["priority"]})
+    
     try:
         # Queue the job
-        job_id = await queue_generation_job({
-            "scene_id": request.scene_id,
-            "prompt": request.prompt,
-            "negative_prompt": request.negative_prompt,
-            "style": request.style,
-            "aspect_ratio": request.aspect_ratio,
-            "character_embedding": request.character_embedding,
-        })
+        job_id = await queue_generation_job(payload)
         
         logger.info(f"Generation job queued: {job_id}")
         
@@ -63,18 +232,155 @@ async def create_generation_job(
             status="queued",
             message="Image generation started"
         )
+    except QueueUnavailableError as e:
+        logger.error(f"Generation queue unavailable: {e}")
+        raise HTTPException(status_code=503, detail="Generation queue unavailable")
     except Exception as e:
         logger.error(f"Failed to queue generation job: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/batch", response_model=BatchGenerateImageResponse)
+async def create_generation_jobs(request: BatchGenerateImageRequest):
+    """
+    Queue image generation jobs for several scenes at once
+    
+    The whole batch is validated up front and enqueued atomically.
+    """
+    payloads = [_job_payload(item, "bulk") for item in request.items]
+    await check_characters(request.items)
+    await check_admission({payload["priority"] for payload in payloads})
+    
+    try:
+        job_ids = await queue_generation_jobs(payloads)
+        
+        logger.info(f"Generation batch queued: {len(job_ids)} jobs")
+        
+        return BatchGenerateImageResponse(
+            job_ids=job_ids,
+            status="queued",
+            message=f"{len(job_ids)} image generations started",
+        )
+    except QueueUnavailableError as e:
+        logger.error(f"Generation queue unavailable: {e}")
+        raise HTTPException(status_code=503, detail="Generation queue unavailable")
+    except Exception as e:
+        logger.error(f"Failed to queue generation batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/upscale", response_model=GenerateImageResponse)
+async def create_upscale_job(request: UpscaleImageRequest):
+    """
+    Queue an image upscale job
+    """
+    try:
+        job_id = await queue_generation_job({
+            "type": "upscale",
+            "image_url": request.image_url,
+            "scene_id": request.scene_id,
+            "project_id": request.project_id,
+            "user_id": request.user_id,
+        })
+        
+        logger.info(f"Upscale job queued: {job_id}")
+        
+        return GenerateImageResponse(
+            job_id=job_id,
+            status="queued",
+            message="Image upscale started"
+        )
+    except QueueUnavailableError as e:
+        logger.error(f"Generation queue unavailable: {e}")
+        raise HTTPException(status_code=503, detail="Generation queue unavailable")
+    except Exception as e:
+        logger.error(f"Failed to queue upscale job: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/queue", response_model=QueueStats)
+async def get_queue_stats():
+    """
+    Report queue depth, in-flight jobs and estimated drain time
+    
+    Intended as the autoscaling signal for worker replicas.
+    """
+    try:
+        stats = await queue_manager.queue_stats(max_age=settings.queue_stats_max_age_seconds)
+    except Exception as e:
+        logger.error(f"Failed to read queue stats: {e}")
+        raise HTTPException(status_code=503, detail="Generation queue unavailable")
+    
+    if not stats:
+        raise HTTPException(status_code=503, detail="Generation queue unavailable")
+    
+    return QueueStats(**stats)
+
+
 @router.get("/job/{job_id}", response_model=GenerationStatus)
-async def get_generation_status(job_id: str):
+async def get_generation_status(
+    job_id: str,
+    wait: int = Query(0, ge=0, le=60, description="Long-poll for up to N seconds"),
+    since: Optional[str] = Query(None, description="Last status seen by the client"),
+):
     """
     Get the status of a generation job
+    
+    With `wait`, the request is held until the status differs from `since`
+    (or from the current status), a completed job's chained upscale
+    finishes, or the timeout expires.
     """
-    # TODO: Implement status lookup from Redis/Database
-    return GenerationStatus(
-        job_id=job_id,
-        status="pending"
+    await queue_manager.ensure_connected()
+    try:
+        if wait:
+            job = await queue_manager.wait_for_job_update(job_id, since=since, timeout=wait)
+        else:
+            job = await queue_manager.get_job_status(job_id)
+    except RedisError as e:
+        logger.error(f"Generation queue unavailable: {e}")
+        raise HTTPException(status_code=503, detail="Generation queue unavailable")
+    
+    if not job:
+        # Without Redis a missing job is unknown, not gone
+        if not queue_manager.redis:
+            raise HTTPException(status_code=503, detail="Generation queue unavailable")
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return _job_status(job)
+
+
+@router.get("/events")
+async def stream_generation_events(
+    job_ids: list[str] = Query([]),
+    project_id: Optional[str] = Query(None, pattern=ID_PATTERN),
+):
+    """
+    Stream job status transitions as Server-Sent Events
+    
+    Follow either a set of `job_ids` (the stream closes once all of them
+    finish) or every job of a storyboard via `project_id`.
+    """
+    if not job_ids and not project_id:
+        raise HTTPException(status_code=400, detail="job_ids or project_id is required")
+    
+    if not await queue_manager.ensure_connected():
+        raise HTTPException(status_code=503, detail="Generation queue unavailable")
+    
+    async def event_stream():
+        try:
+            async for job in queue_manager.stream_job_events(job_ids, project_id):
+                if job is None:
+                    yield ": keepalive\n\n"
+                    continue
+                
+                event = _job_status(job)
+                yield f"event: status\ndata: {event.model_dump_json()}\n\n"
+        except QueueUnavailableError as e:
+            # End the stream, EventSource clients reconnect on their own
+            logger.warning(f"Job event stream unavailable: {e}")
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
@@ -2,8 +2,14 @@
 Health check endpoints
 """
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
+from fastapi.responses import JSONResponse
 from datetime import datetime
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from config import settings
+from services.metrics import set_queue_depth
+from services.queue_manager import queue_manager
 
 router = APIRouter()
 
@@ -20,7 +26,28 @@ async def health_check():
 @router.get("/ready")
 async def readiness_check():
     """Readiness probe for Kubernetes"""
-    return {
-        "status": "ready",
-        "timestamp": datetime.utcnow().isoformat(),
-    }
+    redis_ok = await queue_manager.ping()
+    
+    return JSONResponse(
+        status_code=200 if redis_ok else 503,
+        content={
+            "status": "ready" if redis_ok else "not ready",
+            "redis": {
+                "connected": redis_ok,
+                "max_connections": settings.redis_max_connections,
+            },
+            "timestamp": datetime.utcnow().isoformat(),
+        },
+    )
+
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    try:
+        set_queue_depth(await queue_manager.queue_depth())
+    except Exception:
+        # Still serve the process metrics while Redis is down
+        pass
+    
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -6,7 +6,7 @@ import logging
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 
-from services.prompt_engineer import enhance_prompt
+from services.prompt_engineer import enhance_prompt, enhance_prompts
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +28,14 @@ class PromptResponse(BaseModel):
     style_tokens: list[str]
 
 
+class BatchPromptRequest(BaseModel):
+    items: list[PromptRequest] = Field(..., min_length=1, max_length=200)
+
+
+class BatchPromptResponse(BaseModel):
+    items: list[PromptResponse]
+
+
 @router.post("/enhance", response_model=PromptResponse)
 async def enhance_scene_prompt(request: PromptRequest):
     """
@@ -51,3 +59,38 @@ async def enhance_scene_prompt(request: PromptRequest):
     except Exception as e:
         logger.error(f"Failed to enhance prompt: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/enhance/batch", response_model=BatchPromptResponse)
+async def enhance_scene_prompts(request: BatchPromptRequest):
+    """
+    Enhance the scene descriptions of a whole storyboard
+    
+    Results are returned in request order.
+    """
+    try:
+        results = await enhance_prompts([
+            {
+                "description": item.scene_description,
+                "style": item.style,
+                "characters": item.characters,
+                "location": item.location,
+                "time_of_day": item.time_of_day,
+                "camera_angle": item.camera_angle,
+            }
+            for item in request.items
+        ])
+        
+        return BatchPromptResponse(
+            items=[
+                PromptResponse(
+                    enhanced_prompt=result["prompt"],
+                    negative_prompt=result["negative_prompt"],
+                    style_tokens=result["style_tokens"],
+                )
+                for result in results
+            ]
+        )
+    except Exception as e:
+        logger.error(f"Failed to enhance prompts: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,268 @@
+"""
+Per-project character references for consistent characters across scenes
+
+A character is registered once per project and referred to by its ID
+afterwards, so generation jobs carry only the ID instead of the
+character data. Records live in Redis with an in-process LRU in front.
+"""
+
+import asyncio
+import hashlib
+import io
+import ipaddress
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from urllib.parse import urljoin, urlsplit
+
+import httpx
+from PIL import Image
+
+from config import settings
+from services import postprocess
+from services.queue_manager import QueueUnavailableError, queue_manager
+from services.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+# Redirects followed when fetching a reference image, each one re-checked
+MAX_REDIRECTS = 3
+
+# Project and character IDs end up in Redis keys and object store paths
+ID_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+
+
+class ReferenceImageError(ValueError):
+    """Raised when a reference image URL is not allowed or not an image"""
+
+# In-process tier, keyed by Redis key
+_characters: OrderedDict[str, Dict[str, Any]] = OrderedDict()
+
+
+def character_key(project_id: str, character_id: str) -> str:
+    """Redis key of a character record"""
+    return f"character:{project_id}:{character_id}"
+
+
+def character_id(
+    project_id: str,
+    name: str,
+    description: Optional[str],
+    reference_image_url: Optional[str],
+    embedding: Optional[str],
+) -> str:
+    """Derive a character ID from its definition, so re-registering is a no-op"""
+    canonical = json.dumps(
+        [project_id, name, description, reference_image_url, embedding],
+        separators=(",", ":"),
+    )
+    return "chr_" + hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+def _remember(key: str, character: Dict[str, Any]):
+    """Store a character in the local LRU"""
+    _characters[key] = character
+    _characters.move_to_end(key)
+    while len(_characters) > settings.character_cache_size:
+        _characters.popitem(last=False)
+
+
+async def get_character(project_id: str, character_id: str) -> Dict[str, Any] | None:
+    """
+    Look up a registered character in the local LRU, then in Redis
+    
+    Every Redis hit extends the record's TTL, so characters of active
+    projects never expire.
+    
+    Returns:
+        Character record, or None if it is not registered
+        
+    Raises:
+        QueueUnavailableError: Redis is not connected
+        redis.RedisError: The lookup failed; the character may still exist
+    """
+    key = character_key(project_id, character_id)
+    cached = _characters.get(key)
+    if cached:
+        _characters.move_to_end(key)
+        return cached
+    
+    if not queue_manager.redis:
+        raise QueueUnavailableError("Redis is not connected")
+    
+    data = await queue_manager.redis.getex(key, ex=settings.character_ttl_seconds)
+    if not data:
+        return None
+    
+    character = json.loads(data)
+    _remember(key, character)
+    return character
+
+
+async def _resolve_public(url: str) -> str:
+    """
+    Resolve the host of a client-supplied URL to a public address
+    
+    Returns:
+        The address to connect to, so the request cannot be rebound to
+        another address by a second DNS lookup
+        
+    Raises:
+        ReferenceImageError: Other scheme, or a host resolving to a private,
+            loopback, link-local or otherwise non-global address
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ReferenceImageError("Reference image URL must be http(s)")
+    
+    try:
+        addresses = await asyncio.get_running_loop().getaddrinfo(
+            parts.hostname, parts.port or (443 if parts.scheme == "https" else 80)
+        )
+    except OSError as e:
+        raise ReferenceImageError(f"Cannot resolve {parts.hostname}: {e}")
+    
+    resolved = [ipaddress.ip_address(sockaddr[0].split("%")[0]) for *_, sockaddr in addresses]
+    if not resolved or not all(address.is_global for address in resolved):
+        raise ReferenceImageError(f"Reference image host {parts.hostname} is not public")
+    return str(resolved[0])
+
+
+async def _download(url: str) -> bytes:
+    """
+    Download a client-supplied image URL safely
+    
+    Every redirect target is checked like the original URL and fetched
+    from the address that was checked, and the body is streamed up to
+    `character_reference_max_bytes`.
+    """
+    client = postprocess.get_client()
+    for _ in range(MAX_REDIRECTS + 1):
+        address = await _resolve_public(url)
+        target = httpx.URL(url)
+        async with client.stream(
+            "GET",
+            target.copy_with(host=address),
+            headers={"Host": target.netloc.decode("ascii")},
+            # TLS still verifies the certificate against the original host
+            extensions={"sni_hostname": target.host},
+            follow_redirects=False,
+        ) as response:
+            if response.is_redirect:
+                url = urljoin(url, response.headers["location"])
+                continue
+            response.raise_for_status()
+            
+            limit = settings.character_reference_max_bytes
+            if int(response.headers.get("content-length") or 0) > limit:
+                raise ReferenceImageError(f"Reference image is larger than {limit} bytes")
+            
+            data = bytearray()
+            async for chunk in response.aiter_bytes():
+                data += chunk
+                if len(data) > limit:
+                    raise ReferenceImageError(f"Reference image is larger than {limit} bytes")
+            return bytes(data)
+    
+    raise ReferenceImageError("Too many redirects fetching the reference image")
+
+
+async def _fetch_reference(project_id: str, url: str) -> Dict[str, str]:
+    """
+    Download a reference image once and keep a durable copy
+    
+    Returns:
+        "reference_image_url" (object store copy, or the source URL when no
+        store is configured) and "reference_digest" (SHA-256 of the image)
+        
+    Raises:
+        ReferenceImageError: The URL is not allowed or is not an image
+    """
+    data = await _download(url)
+    
+    # Reject anything that is not a readable image up front
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.verify()
+            extension = (image.format or "png").lower()
+    except Exception as e:
+        raise ReferenceImageError(f"Reference image is not a valid image: {e}")
+    
+    digest = hashlib.sha256(data).hexdigest()
+    storage = get_storage()
+    if storage:
+        url = await storage.put(
+            f"characters/{project_id}/{digest}.{extension}",
+            data,
+            f"image/{extension}",
+        )
+    return {"reference_image_url": url, "reference_digest": digest}
+
+
+async def register_character(
+    project_id: str,
+    name: str,
+    description: Optional[str] = None,
+    reference_image_url: Optional[str] = None,
+    embedding: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Register a character of a project
+    
+    The reference image is fetched and stored only on first registration;
+    registering the same definition again returns the existing record.
+    
+    Args:
+        project_id: Storyboard the character belongs to
+        name: Character name
+        description: Appearance, added to the prompt of every scene
+        reference_image_url: Reference image of the character
+        embedding: Precomputed embedding (e.g. IP-Adapter), stored as is
+        
+    Returns:
+        Character record, with its ID under "id"
+        
+    Raises:
+        QueueUnavailableError: Redis is not reachable
+        redis.RedisError: A Redis command failed
+        ReferenceImageError: The reference image URL is not allowed
+        httpx.HTTPError: The reference image could not be fetched
+    """
+    if not await queue_manager.ensure_connected():
+        raise QueueUnavailableError("Redis is not connected")
+    
+    cid = character_id(project_id, name, description, reference_image_url, embedding)
+    existing = await get_character(project_id, cid)
+    if existing:
+        return existing
+    
+    character = {
+        "id": cid,
+        "project_id": project_id,
+        "name": name,
+        "description": description,
+        "reference_image_url": None,
+        "reference_digest": None,
+        "embedding": embedding,
+        "created_at": time.time(),
+    }
+    if reference_image_url:
+        character.update(await _fetch_reference(project_id, reference_image_url))
+    
+    key = character_key(project_id, cid)
+    await queue_manager.redis.set(
+        key, json.dumps(character), ex=settings.character_ttl_seconds
+    )
+    _remember(key, character)
+    
+    logger.info(f"🧑 Character registered: {cid} ({name}) in project {project_id}")
+    return character
+
+
+def character_prompt(character: Dict[str, Any]) -> str:
+    """Prompt fragment describing a character"""
+    if character.get("description"):
+        return f"{character['name']}, {character['description']}"
+    return character["name"]
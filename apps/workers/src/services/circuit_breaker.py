@@ -0,0 +1,96 @@
+"""
+Circuit breaker for calls to slow or failing providers
+"""
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider while its circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Stop calling a provider after repeated failures or slow calls
+    
+    After `failure_threshold` consecutive failures (a call slower than
+    `slow_call_seconds` counts as one) the circuit opens and `allow`
+    returns None for `reset_seconds`. Then a single probe call is let
+    through: success closes the circuit, failure opens it again.
+    
+    State is per process; each replica learns about an outage from its
+    own calls.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        slow_call_seconds: float = 5.0,
+        reset_seconds: float = 30.0,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probing = False
+    
+    @property
+    def state(self) -> str:
+        """Current state: closed, open or half_open"""
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return "open"
+        return "half_open"
+    
+    def allow(self) -> str | None:
+        """
+        Whether a call may go ahead now
+        
+        Returns:
+            "probe" for the single half-open probe, which the caller must
+            end with `release_probe`, "call" for any other allowed call,
+            or None while the circuit is open
+        """
+        state = self.state
+        if state == "closed":
+            return "call"
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return "probe"
+        return None
+    
+    def record_success(self, seconds: float = 0):
+        """Record a finished call and how long it took"""
+        if seconds > self.slow_call_seconds:
+            self.record_failure(f"slow call ({seconds:.1f}s)")
+            return
+        
+        if self.opened_at is not None:
+            logger.info(f"🟢 Circuit {self.name} closed")
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+    
+    def release_probe(self):
+        """End the half-open probe granted by `allow`, whatever its outcome"""
+        self._probing = False
+    
+    def record_failure(self, reason: str = "error"):
+        """Record a failed call, opening the circuit past the threshold"""
+        self.failures += 1
+        if self._probing or (
+            self.opened_at is None and self.failures >= self.failure_threshold
+        ):
+            logger.warning(
+                f"🔴 Circuit {self.name} open for {self.reset_seconds:.0f}s "
+                f"after {self.failures} failures, last: {reason}"
+            )
+            self.opened_at = time.monotonic()
+        self._probing = False
@@ -0,0 +1,237 @@
+"""
+Image backends - where predictions actually run
+
+The backend is selected with `settings.image_backend`: "replicate" runs
+SDXL on Replicate, "stub" draws deterministic placeholder images locally
+for load testing without network access or provider costs.
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import random
+import textwrap
+from pathlib import Path
+from typing import Any, Dict
+
+import httpx
+from PIL import Image, ImageDraw
+
+from config import settings
+from services.storage import local_public_url
+
+logger = logging.getLogger(__name__)
+
+REPLICATE_API_URL = "https://api.replicate.com/v1"
+
+# Pinned model versions
+SDXL_VERSION = "39ed52f2a78e934b3ba6e2a89f5b1c712de7dfea351df4979778f7e9332fd5ab"
+REAL_ESRGAN_VERSION = "42fed1c4974146d4d2414e2be2c5277c7fcf05fcc3a73abf41610695738c1d7b"
+
+# Shared HTTP client (connection pool reused across predictions)
+_client: httpx.AsyncClient | None = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Get the shared Replicate HTTP client, creating it on first use"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=REPLICATE_API_URL,
+            headers={"Authorization": f"Bearer {settings.replicate_api_key}"},
+            timeout=httpx.Timeout(settings.replicate_request_timeout_seconds),
+            limits=httpx.Limits(
+                max_connections=settings.replicate_max_connections,
+                max_keepalive_connections=settings.replicate_max_connections,
+            ),
+        )
+    return _client
+
+
+async def close_client():
+    """Close the shared Replicate HTTP client"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def run_prediction(version: str, input: Dict[str, Any]) -> Any:
+    """
+    Create a Replicate prediction and poll it until it finishes
+    
+    Polling backs off from `replicate_poll_interval_seconds` up to
+    `replicate_poll_max_interval_seconds` so the event loop stays free
+    for other jobs while the prediction runs.
+    
+    Args:
+        version: Model version hash
+        input: Model input parameters
+        
+    Returns:
+        Prediction output
+    """
+    client = get_client()
+    
+    response = await client.post(
+        "/predictions",
+        json={"version": version, "input": input},
+    )
+    response.raise_for_status()
+    prediction = response.json()
+    
+    interval = settings.replicate_poll_interval_seconds
+    try:
+        while prediction["status"] not in ("succeeded", "failed", "canceled"):
+            await asyncio.sleep(interval)
+            interval = min(interval * 1.5, settings.replicate_poll_max_interval_seconds)
+            
+            response = await client.get(prediction["urls"]["get"])
+            response.raise_for_status()
+            prediction = response.json()
+    except asyncio.CancelledError:
+        # Stop paying for a prediction nobody is waiting for
+        try:
+            await asyncio.shield(client.post(prediction["urls"]["cancel"]))
+        except Exception as e:
+            logger.warning(f"Failed to cancel prediction {prediction.get('id')}: {e}")
+        raise
+    
+    if prediction["status"] != "succeeded":
+        raise RuntimeError(
+            prediction.get("error") or f"Prediction {prediction['status']}"
+        )
+    
+    return prediction["output"]
+
+
+# Model aliases accepted in `replicate_model_version`
+SDXL_ALIASES = {
+    "sdxl": SDXL_VERSION,
+    "sdxl-1.0": SDXL_VERSION,
+}
+
+
+class ReplicateBackend:
+    """Run predictions on Replicate"""
+    
+    name = "replicate"
+    
+    def __init__(self):
+        version = settings.replicate_model_version
+        self.model_version = SDXL_ALIASES.get(version, version)
+        self.upscale_model_version = REAL_ESRGAN_VERSION
+    
+    async def generate(self, input: Dict[str, Any]) -> list[str]:
+        """Run an SDXL prediction and return the output image URLs"""
+        output = await run_prediction(self.model_version, input=input)
+        return output if isinstance(output, list) else [output]
+    
+    async def upscale(self, image_url: str) -> str:
+        """Upscale an image with Real-ESRGAN and return the output URL"""
+        return await run_prediction(
+            self.upscale_model_version,
+            input={
+                "image": image_url,
+                "scale": 2,
+                "face_enhance": True,
+            }
+        )
+
+
+class StubBackend:
+    """
+    Local stand-in for load testing
+    
+    Sleeps for a configurable latency, fails with a configurable rate
+    (as a transient network error, so retries are exercised) and returns
+    a placeholder image drawn with Pillow. The same input always yields
+    the same image. Images are written under `storage_local_path` and
+    served from `storage_public_url` (the API's /media mount by default).
+    """
+    
+    name = "stub"
+    model_version = "stub"
+    upscale_model_version = "stub"
+    
+    def __init__(self):
+        self.root = Path(settings.storage_local_path) / "stub"
+        self.public_url = f"{local_public_url().rstrip('/')}/stub"
+    
+    async def _simulate(self):
+        """Wait like a prediction would, and sometimes fail like one"""
+        latency = random.gauss(settings.stub_latency_seconds, settings.stub_latency_jitter_seconds)
+        await asyncio.sleep(max(0.0, latency))
+        if random.random() < settings.stub_error_rate:
+            raise httpx.ConnectError("Stub backend: injected failure")
+    
+    def _draw(self, digest: str, width: int, height: int, text: str) -> str:
+        """Draw and store a placeholder image, returning its file name"""
+        name = f"{digest}.png"
+        path = self.root / name
+        if path.exists():
+            return name
+        
+        color = tuple(int(digest[i:i + 2], 16) // 2 + 64 for i in (0, 2, 4))
+        image = Image.new("RGB", (width, height), color)
+        draw = ImageDraw.Draw(image)
+        
+        step = max(width, height) // 8
+        for x in range(0, width, step):
+            draw.line([(x, 0), (x, height)], fill=(255, 255, 255), width=1)
+        for y in range(0, height, step):
+            draw.line([(0, y), (width, y)], fill=(255, 255, 255), width=1)
+        draw.multiline_text(
+            (24, 24),
+            "\n".join(textwrap.wrap(text, width=60)[:12]),
+            fill=(255, 255, 255),
+        )
+        
+        self.root.mkdir(parents=True, exist_ok=True)
+        buffer = io.BytesIO()
+        image.save(buffer, "PNG")
+        path.write_bytes(buffer.getvalue())
+        return name
+    
+    async def generate(self, input: Dict[str, Any]) -> list[str]:
+        """Return placeholder image URLs for an SDXL input"""
+        await self._simulate()
+        
+        urls = []
+        for index in range(input.get("num_outputs", 1)):
+            digest = hashlib.sha256(
+                json.dumps({**input, "index": index}, sort_keys=True).encode()
+            ).hexdigest()
+            name = await asyncio.to_thread(
+                self._draw,
+                digest,
+                input.get("width", 1024),
+                input.get("height", 1024),
+                input.get("prompt", ""),
+            )
+            urls.append(f"{self.public_url}/{name}")
+        return urls
+    
+    async def upscale(self, image_url: str) -> str:
+        """Pretend to upscale: returns the input URL after the usual delay"""
+        await self._simulate()
+        return image_url
+
+
+_backend: ReplicateBackend | StubBackend | None = None
+
+
+def get_backend() -> ReplicateBackend | StubBackend:
+    """Get the configured image backend"""
+    global _backend
+    if _backend is None:
+        if settings.image_backend == "stub":
+            _backend = StubBackend()
+        elif settings.image_backend == "replicate":
+            _backend = ReplicateBackend()
+        else:
+            raise ValueError(f"Unknown image backend: {settings.image_backend}")
+        logger.info(f"🖼️ Image backend: {_backend.name}")
+    return _backend
@@ -1,35 +1,77 @@
 """
-Image generation service using Replicate API
+Image generation service (Replicate SDXL or a local stub backend)
 """
 
+import asyncio
 import logging
-import replicate
+import random
+import time
 from typing import Optional, Dict, Any
 
+import httpx
+from redis.exceptions import RedisError
+
 from config import settings
+from services.character_store import character_prompt, get_character
+from services.image_backends import get_backend
+from services.metrics import PREDICTION_TIME, aspect_ratio_label, style_label
+from services.queue_manager import QueueUnavailableError
+from services.rate_limiter import rate_limiter
+from services.result_cache import get_cached_result, result_cache_key, store_result
 
 logger = logging.getLogger(__name__)
 
+# SDXL returns at most this many images per prediction
+MAX_VARIANTS = 4
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Whether a generation error is worth retrying"""
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError))
+
 
 async def generate_image(
     prompt: str,
     negative_prompt: Optional[str] = None,
     style: str = "cinematic",
     aspect_ratio: str = "16:9",
-    character_embedding: Optional[str] = None,
+    character_id: Optional[str] = None,
+    project_id: Optional[str] = None,
+    seed: Optional[int] = None,
+    force_regenerate: bool = False,
+    variants: int = 1,
 ) -> Dict[str, Any]:
     """
-    Generate an image using Replicate API (SDXL)
+    Generate one or more images with SDXL on the configured image backend
+    
+    Results are cached by their fully resolved inputs, so regenerating an
+    unchanged scene returns the previous images without a new prediction.
+    
+    The prediction waits for capacity under the backend's shared rate
+    limit first; `generation_timeout_seconds` only starts once capacity
+    is acquired, so waiting for the provider is never a failure.
+    
+    All variants come from a single prediction. Without a fixed seed a
+    random one is picked; each image records the seed and its index in
+    the batch, which together reproduce it.
     
     Args:
         prompt: The text prompt for image generation
         negative_prompt: Things to avoid in the image
         style: Art style (cinematic, anime, disney, etc.)
         aspect_ratio: Image aspect ratio
-        character_embedding: Optional IP-Adapter embedding for character consistency
+        character_id: Registered character of the project to include
+        project_id: Project the character belongs to
+        seed: Fixed seed for reproducible output
+        force_regenerate: Skip the result cache and always run a new prediction
+        variants: Number of images to generate (1-4)
         
     Returns:
-        Dictionary with image URL and metadata
+        Dictionary with "images" (URL, seed and index of each image), the
+        first image's URL as "image_url", and metadata
     """
     if settings.debug_ai:
         logger.info(f"🤖 PROMPT: {prompt}")
@@ -55,77 +97,144 @@ async def generate_image(
         "sketch": "pencil sketch, hand drawn, artistic, monochrome",
     }
     
-    # Enhance prompt with style
+    # Enhance prompt with the character and style
     style_prompt = style_modifiers.get(style, "")
     full_prompt = f"{prompt}, {style_prompt}"
     
+    if character_id:
+        try:
+            character = await get_character(project_id or "", character_id)
+        except (QueueUnavailableError, RedisError) as e:
+            # The character may well exist, try again once Redis is back
+            return {
+                "success": False,
+                "error": f"Character lookup failed: {e}",
+                "retryable": True,
+            }
+        if not character:
+            return {
+                "success": False,
+                "error": f"Unknown character {character_id} in project {project_id}",
+                "retryable": False,
+            }
+        full_prompt = f"{prompt}, {character_prompt(character)}, {style_prompt}"
+    
     if negative_prompt:
         full_negative = f"{negative_prompt}, low quality, blurry, distorted"
     else:
         full_negative = "low quality, blurry, distorted, deformed, ugly"
     
+    variants = max(1, min(variants, MAX_VARIANTS))
+    
+    backend = get_backend()
+    cache_key = result_cache_key(
+        full_prompt, full_negative, width, height, backend.model_version, seed, variants
+    )
+    if not force_regenerate:
+        cached = await get_cached_result(cache_key)
+        if cached:
+            logger.info(f"♻️ Image served from cache: {cached['image_url']}")
+            return {**cached, "cached": True, "cache_key": cache_key}
+    
+    model_input = {
+        "prompt": full_prompt,
+        "negative_prompt": full_negative,
+        "width": width,
+        "height": height,
+        "num_outputs": variants,
+        "num_inference_steps": 30,
+        "guidance_scale": 7.5,
+        "scheduler": "DPMSolverMultistep",
+        # Always pass a seed so every image can be reproduced
+        "seed": seed if seed is not None else random.randrange(2**32),
+    }
+    
     try:
-        # Run SDXL through Replicate
-        output = replicate.run(
-            "stability-ai/sdxl:39ed52f2a78e934b3ba6e2a89f5b1c712de7dfea351df4979778f7e9332fd5ab",
-            input={
-                "prompt": full_prompt,
-                "negative_prompt": full_negative,
-                "width": width,
-                "height": height,
-                "num_outputs": 1,
-                "num_inference_steps": 30,
-                "guidance_scale": 7.5,
-                "scheduler": "DPMSolverMultistep",
-            }
-        )
+        # Run SDXL on the configured backend
+        async with rate_limiter.limit(backend.name, backend.model_version):
+            started = time.perf_counter()
+            output = await asyncio.wait_for(
+                backend.generate(model_input),
+                timeout=settings.generation_timeout_seconds,
+            )
+            PREDICTION_TIME.labels(
+                style=style_label(style), aspect_ratio=aspect_ratio_label(aspect_ratio)
+            ).observe(
+                time.perf_counter() - started
+            )
         
-        # Replicate returns a list with image URL
-        image_url = output[0] if isinstance(output, list) else output
+        images = [
+            {"image_url": image_url, "seed": model_input["seed"], "index": index}
+            for index, image_url in enumerate(output)
+        ]
         
-        logger.info(f"✅ Image generated: {image_url}")
+        logger.info(f"✅ {len(images)} image(s) generated: {images[0]['image_url']}")
         
-        return {
+        result = {
             "success": True,
-            "image_url": image_url,
+            "image_url": images[0]["image_url"],
+            "images": images,
             "prompt": full_prompt,
             "negative_prompt": full_negative,
             "metadata": {
                 "width": width,
                 "height": height,
                 "style": style,
+                "seed": model_input["seed"],
+                "variants": len(images),
+                "character_id": character_id,
             }
         }
+        await store_result(cache_key, result)
         
+        return {**result, "cache_key": cache_key}
+        
+    except asyncio.TimeoutError:
+        logger.error(f"Image generation timed out after {settings.generation_timeout_seconds}s")
+        return {
+            "success": False,
+            "error": f"Generation timed out after {settings.generation_timeout_seconds}s",
+            "retryable": True,
+        }
     except Exception as e:
         logger.error(f"Image generation failed: {e}")
         return {
             "success": False,
             "error": str(e),
+            "retryable": is_transient_error(e),
         }
 
 
 async def upscale_image(image_url: str) -> Dict[str, Any]:
     """
-    Upscale an image using Replicate
+    Upscale an image (Real-ESRGAN on Replicate)
+    
+    Like `generate_image`, `upscale_timeout_seconds` starts once rate
+    limit capacity is acquired.
     """
+    backend = get_backend()
     try:
-        output = replicate.run(
-            "nightmareai/real-esrgan:42fed1c4974146d4d2414e2be2c5277c7fcf05fcc3a73abf41610695738c1d7b",
-            input={
-                "image": image_url,
-                "scale": 2,
-                "face_enhance": True,
-            }
-        )
+        async with rate_limiter.limit(backend.name, backend.upscale_model_version):
+            output = await asyncio.wait_for(
+                backend.upscale(image_url),
+                timeout=settings.upscale_timeout_seconds,
+            )
         
         return {
             "success": True,
             "image_url": output,
         }
+    except asyncio.TimeoutError:
+        logger.error(f"Image upscaling timed out after {settings.upscale_timeout_seconds}s")
+        return {
+            "success": False,
+            "error": f"Upscale timed out after {settings.upscale_timeout_seconds}s",
+            "retryable": True,
+        }
     except Exception as e:
         logger.error(f"Image upscaling failed: {e}")
         return {
             "success": False,
             "error": str(e),
+            "retryable": is_transient_error(e),
         }
@@ -0,0 +1,74 @@
+"""
+Prometheus metrics for the generation pipeline
+"""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Known label values; anything else from client input is reported as
+# "other" so requests cannot create unbounded time series
+STYLE_LABELS = {"cinematic", "anime", "disney", "pixar", "noir", "sketch"}
+ASPECT_RATIO_LABELS = {"16:9", "9:16", "1:1", "2.35:1"}
+
+# Seconds, from cache hits up to slow SDXL predictions
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+QUEUE_WAIT = Histogram(
+    "generation_queue_wait_seconds",
+    "Time from enqueue to dequeue of a generation job",
+    ["style", "aspect_ratio"],
+    buckets=LATENCY_BUCKETS,
+)
+
+PREDICTION_TIME = Histogram(
+    "generation_prediction_seconds",
+    "Time spent waiting for an image prediction",
+    ["style", "aspect_ratio"],
+    buckets=LATENCY_BUCKETS,
+)
+
+PROMPT_ENHANCEMENT_TIME = Histogram(
+    "prompt_enhancement_seconds",
+    "Time spent enhancing a scene prompt",
+    ["style", "source"],
+    buckets=LATENCY_BUCKETS,
+)
+
+JOB_TIME = Histogram(
+    "generation_job_seconds",
+    "Time from enqueue to completion of a generation job",
+    ["style", "aspect_ratio", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+JOBS = Counter(
+    "generation_jobs_total",
+    "Finished generation jobs",
+    ["status"],
+)
+
+QUEUE_DEPTH = Gauge(
+    "generation_queue_depth",
+    "Jobs waiting in the generation queue",
+    ["lane"],
+)
+
+JOBS_IN_FLIGHT = Gauge(
+    "generation_jobs_in_flight",
+    "Generation jobs currently being processed by this worker",
+)
+
+
+def style_label(style: str | None) -> str:
+    """Bounded label value for a requested style"""
+    return style if style in STYLE_LABELS else "other"
+
+
+def aspect_ratio_label(aspect_ratio: str | None) -> str:
+    """Bounded label value for a requested aspect ratio"""
+    return aspect_ratio if aspect_ratio in ASPECT_RATIO_LABELS else "other"
+
+
+def set_queue_depth(depth: dict[str, int]):
+    """Update the queue depth gauge from a `QueueManager.queue_depth` result"""
+    for lane, count in depth.items():
+        QUEUE_DEPTH.labels(lane=lane).set(count)
@@ -0,0 +1,101 @@
+"""
+Post-processing of generated images - mirroring and web variants
+"""
+
+import asyncio
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+import httpx
+from PIL import Image
+
+from config import settings
+from services.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+# Pillow releases the GIL while encoding, so variants build in parallel
+_executor = ThreadPoolExecutor(
+    max_workers=settings.postprocess_threads,
+    thread_name_prefix="postprocess",
+)
+
+# Shared client for downloading provider outputs
+_client: httpx.AsyncClient | None = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Get the shared download client, creating it on first use"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(timeout=httpx.Timeout(60.0), follow_redirects=True)
+    return _client
+
+
+async def close_client():
+    """Close the shared download client"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def build_variants(data: bytes) -> Dict[str, bytes]:
+    """
+    Encode web variants of an image
+    
+    Returns:
+        WebP bytes of the full image ("webp") and of a thumbnail ("thumbnail")
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGB")
+        
+        full = io.BytesIO()
+        image.save(full, "WEBP", quality=settings.webp_quality, method=4)
+        
+        image.thumbnail((settings.thumbnail_max_size, settings.thumbnail_max_size))
+        thumbnail = io.BytesIO()
+        image.save(thumbnail, "WEBP", quality=settings.webp_quality, method=4)
+    
+    return {"webp": full.getvalue(), "thumbnail": thumbnail.getvalue()}
+
+
+async def mirror_image(job_id: str, image_url: str) -> Dict[str, str] | None:
+    """
+    Copy a generated image to object storage and add web variants
+    
+    Args:
+        job_id: Job the image belongs to (used as the storage prefix)
+        image_url: Provider delivery URL of the image
+        
+    Returns:
+        Public URLs ("image_url", "webp_url", "thumbnail_url"), or None
+        when no object store is configured
+    """
+    storage = get_storage()
+    if not storage:
+        return None
+    
+    response = await get_client().get(image_url)
+    response.raise_for_status()
+    data = response.content
+    content_type = response.headers.get("content-type", "image/png")
+    extension = content_type.split("/")[-1].split(";")[0] or "png"
+    
+    loop = asyncio.get_running_loop()
+    variants = await loop.run_in_executor(_executor, build_variants, data)
+    
+    prefix = f"generations/{job_id}"
+    original_url, webp_url, thumbnail_url = await asyncio.gather(
+        storage.put(f"{prefix}/original.{extension}", data, content_type),
+        storage.put(f"{prefix}/full.webp", variants["webp"], "image/webp"),
+        storage.put(f"{prefix}/thumbnail.webp", variants["thumbnail"], "image/webp"),
+    )
+    
+    return {
+        "image_url": original_url,
+        "webp_url": webp_url,
+        "thumbnail_url": thumbnail_url,
+    }
@@ -2,15 +2,41 @@
 Prompt engineering service - Convert scene descriptions to AI prompts
 """
 
+import asyncio
+import hashlib
+import json
 import logging
+import time
+from collections import OrderedDict
 from typing import Optional
 
 from openai import AsyncOpenAI
 
 from config import settings
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from services.metrics import PROMPT_ENHANCEMENT_TIME, style_label
+from services.queue_manager import queue_manager
+from services.rate_limiter import rate_limiter
 
 logger = logging.getLogger(__name__)
 
+# Shared OpenAI client (connection pool reused across requests)
+_client: AsyncOpenAI | None = None
+
+# In-process tier of the enhancement cache, backed by Redis
+_prompt_cache: OrderedDict[str, dict] = OrderedDict()
+
+# Serves template prompts right away while OpenAI is failing or slow
+_breaker = CircuitBreaker(
+    "openai",
+    failure_threshold=settings.llm_breaker_failure_threshold,
+    slow_call_seconds=settings.llm_breaker_slow_call_seconds,
+    reset_seconds=settings.llm_breaker_reset_seconds,
+)
+
+# Completions still running after their request's latency budget ran out
+_background: set[asyncio.Task] = set()
+
 # Camera angle descriptions
 CAMERA_ANGLES = {
     "wide": "wide shot, establishing shot, full scene view",
@@ -31,6 +57,247 @@ TIME_OF_DAY = {
 }
 
 
+def init_client() -> AsyncOpenAI | None:
+    """Create the shared OpenAI client if an API key is configured"""
+    global _client
+    if _client is None and settings.openai_api_key:
+        _client = AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            timeout=settings.openai_timeout_seconds,
+        )
+    return _client
+
+
+async def close_client():
+    """Close the shared OpenAI client"""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+async def _create_completion(client: AsyncOpenAI, scenes: int = 1, **kwargs):
+    """
+    Run one chat completion under the shared OpenAI rate limit
+    
+    Only the provider call is timed for the circuit breaker, so waiting
+    on the local rate limit never counts as a slow call. A completion
+    covering several scenes is timed per scene.
+    """
+    async with rate_limiter.limit("openai", settings.openai_model):
+        started = time.perf_counter()
+        try:
+            response = await client.chat.completions.create(
+                model=settings.openai_model, **kwargs
+            )
+        except Exception as e:
+            _breaker.record_failure(str(e) or type(e).__name__)
+            raise
+        _breaker.record_success((time.perf_counter() - started) / scenes)
+        return response
+
+
+async def _hedged_completion(client: AsyncOpenAI, scenes: int = 1, **kwargs):
+    """
+    Run a chat completion, hedging slow requests
+    
+    If no answer arrived after `prompt_hedge_after_seconds`, a duplicate
+    request is sent and the first successful answer wins.
+    """
+    hedge_after = settings.prompt_hedge_after_seconds
+    if hedge_after <= 0:
+        return await _create_completion(client, scenes, **kwargs)
+    
+    tasks = {asyncio.create_task(_create_completion(client, scenes, **kwargs))}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        if not done:
+            tasks.add(asyncio.create_task(_create_completion(client, scenes, **kwargs)))
+        
+        error: BaseException | None = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def complete(client: AsyncOpenAI, scenes: int = 1, **kwargs):
+    """
+    Run a chat completion through the OpenAI circuit breaker
+    
+    Args:
+        client: Shared OpenAI client
+        scenes: Scenes the completion enhances; the breaker's slow-call
+            threshold applies to the time per scene
+        **kwargs: chat.completions.create arguments other than the model
+        
+    Raises:
+        CircuitOpenError: OpenAI is failing, no request was sent
+    """
+    permit = _breaker.allow()
+    if not permit:
+        raise CircuitOpenError(f"Circuit {_breaker.name} is {_breaker.state}")
+    
+    try:
+        return await _hedged_completion(client, scenes, **kwargs)
+    finally:
+        # A cancelled probe recorded no outcome, let the next call probe.
+        # Calls started while closed must not end a probe still in flight.
+        if permit == "probe":
+            _breaker.release_probe()
+
+
+def _detach(task: asyncio.Task):
+    """Let a completion finish in the background, e.g. to fill the cache"""
+    _background.add(task)
+    
+    def _done(t: asyncio.Task):
+        _background.discard(t)
+        if not t.cancelled() and t.exception():
+            logger.warning(f"Late OpenAI enhancement failed: {t.exception()}")
+    
+    task.add_done_callback(_done)
+
+
+def prompt_cache_key(
+    description: str,
+    style: str,
+    characters: Optional[list[str]],
+    location: Optional[str],
+    time_of_day: str,
+    camera_angle: str,
+) -> str:
+    """Build a cache key from the normalized enhancement inputs"""
+    def normalize(value: Optional[str]) -> Optional[str]:
+        return " ".join(value.split()) if value else None
+    
+    canonical = json.dumps(
+        [
+            settings.openai_model,
+            normalize(description),
+            normalize(style),
+            [normalize(c) for c in characters or []],
+            normalize(location),
+            normalize(time_of_day),
+            normalize(camera_angle),
+        ],
+        separators=(",", ":"),
+    )
+    return f"prompt_cache:{hashlib.sha256(canonical.encode()).hexdigest()}"
+
+
+async def get_cached_prompt(key: str) -> dict | None:
+    """Look up an enhanced prompt in the local LRU, then in Redis"""
+    cached = _prompt_cache.get(key)
+    if cached:
+        _prompt_cache.move_to_end(key)
+        return cached
+    
+    if not queue_manager.redis:
+        return None
+    
+    try:
+        data = await queue_manager.redis.get(key)
+    except Exception as e:
+        logger.warning(f"Prompt cache lookup failed: {e}")
+        return None
+    
+    if not data:
+        return None
+    
+    cached = json.loads(data)
+    _remember_prompt(key, cached)
+    return cached
+
+
+def _remember_prompt(key: str, result: dict):
+    """Store an enhanced prompt in the local LRU"""
+    _prompt_cache[key] = result
+    _prompt_cache.move_to_end(key)
+    while len(_prompt_cache) > settings.prompt_cache_size:
+        _prompt_cache.popitem(last=False)
+
+
+async def store_prompt(key: str, result: dict):
+    """Store an enhanced prompt in both cache tiers"""
+    _remember_prompt(key, result)
+    
+    if not queue_manager.redis:
+        return
+    
+    try:
+        await queue_manager.redis.set(
+            key,
+            json.dumps(result),
+            ex=settings.prompt_cache_ttl_seconds,
+        )
+    except Exception as e:
+        logger.warning(f"Prompt cache store failed: {e}")
+
+
+SYSTEM_PROMPT = """You are an expert AI prompt engineer for image generation.
+            Convert scene descriptions into detailed, visual prompts optimized for SDXL.
+            Be specific about lighting, composition, mood, and visual details.
+            Keep prompts concise but descriptive (under 200 words)."""
+
+LLM_NEGATIVE_PROMPT = "low quality, blurry, distorted, deformed, ugly, bad anatomy, extra limbs, watermark, text"
+
+# Fallback style modifiers
+STYLE_MODIFIERS = {
+    "cinematic": "cinematic lighting, dramatic, professional photography, film grain",
+    "anime": "anime style, studio ghibli, vibrant colors, detailed animation",
+    "disney": "disney style, 3d animation, pixar-like, colorful, expressive",
+    "pixar": "pixar style, 3d rendered, soft lighting, expressive characters",
+    "noir": "film noir, black and white, high contrast, dramatic shadows",
+    "sketch": "pencil sketch, hand drawn, artistic, monochrome, detailed lines",
+}
+
+
+def build_base_prompt(
+    description: str,
+    characters: Optional[list[str]] = None,
+    location: Optional[str] = None,
+    time_of_day: str = "day",
+    camera_angle: str = "medium",
+) -> str:
+    """Combine a scene description with camera, lighting and cast details"""
+    components = [
+        description,
+        CAMERA_ANGLES.get(camera_angle, ""),
+        TIME_OF_DAY.get(time_of_day, ""),
+    ]
+    
+    if location:
+        components.append(f"location: {location}")
+    
+    if characters:
+        components.append(f"characters: {', '.join(characters)}")
+    
+    return ", ".join(filter(None, components))
+
+
+def template_prompt(
+    base_prompt: str,
+    style: str,
+    camera_angle: str,
+    time_of_day: str,
+) -> dict:
+    """Basic enhancement used when the LLM is unavailable"""
+    enhanced = f"{base_prompt}, {STYLE_MODIFIERS.get(style, '')}"
+    
+    return {
+        "prompt": enhanced,
+        "negative_prompt": "low quality, blurry, distorted, deformed, ugly, bad anatomy, watermark, text",
+        "style_tokens": [style, camera_angle, time_of_day],
+    }
+
+
 async def enhance_prompt(
     description: str,
     style: str = "cinematic",
@@ -42,6 +309,10 @@ async def enhance_prompt(
     """
     Enhance a scene description into a detailed AI image prompt
     
+    The template prompt is served instead of the LLM's while the OpenAI
+    circuit is open, or when the LLM has not answered within
+    `prompt_latency_budget_seconds`; a late answer still fills the cache.
+    
     Args:
         description: Basic scene description
         style: Visual style
@@ -53,76 +324,272 @@ async def enhance_prompt(
     Returns:
         Dictionary with enhanced prompt, negative prompt, and style tokens
     """
-    # Build base prompt components
-    components = [
-        description,
-        CAMERA_ANGLES.get(camera_angle, ""),
-        TIME_OF_DAY.get(time_of_day, ""),
-    ]
+    started = time.perf_counter()
     
-    if location:
-        components.append(f"location: {location}")
-    
-    if characters:
-        components.append(f"characters: {', '.join(characters)}")
+    def observe(source: str):
+        PROMPT_ENHANCEMENT_TIME.labels(style=style_label(style), source=source).observe(
+            time.perf_counter() - started
+        )
     
-    base_prompt = ", ".join(filter(None, components))
+    base_prompt = build_base_prompt(
+        description, characters, location, time_of_day, camera_angle
+    )
     
     # Use OpenAI to enhance if available
-    if settings.openai_api_key:
+    client = init_client()
+    if client:
+        cache_key = prompt_cache_key(
+            description, style, characters, location, time_of_day, camera_angle
+        )
+        cached = await get_cached_prompt(cache_key)
+        if cached:
+            observe("cache")
+            return cached
+        
+        task = asyncio.create_task(
+            _enhance_llm(client, cache_key, base_prompt, style, camera_angle, time_of_day)
+        )
         try:
-            client = AsyncOpenAI(api_key=settings.openai_api_key)
-            
-            system_prompt = """You are an expert AI prompt engineer for image generation.
-            Convert scene descriptions into detailed, visual prompts optimized for SDXL.
-            Be specific about lighting, composition, mood, and visual details.
-            Keep prompts concise but descriptive (under 200 words)."""
-            
-            user_prompt = f"""Enhance this scene description for image generation:
+            result = await asyncio.wait_for(
+                asyncio.shield(task),
+                timeout=settings.prompt_latency_budget_seconds or None,
+            )
+            observe("llm")
+            return result
+        except asyncio.TimeoutError:
+            _detach(task)
+            logger.warning(
+                f"OpenAI enhancement exceeded {settings.prompt_latency_budget_seconds}s budget, using fallback"
+            )
+        except CircuitOpenError:
+            pass
+        except Exception as e:
+            logger.warning(f"OpenAI enhancement failed, using fallback: {e}")
+    
+    # Fallback: return basic enhancement
+    result = template_prompt(base_prompt, style, camera_angle, time_of_day)
+    observe("template")
+    return result
+
+
+async def _enhance_llm(
+    client: AsyncOpenAI,
+    cache_key: str,
+    base_prompt: str,
+    style: str,
+    camera_angle: str,
+    time_of_day: str,
+) -> dict:
+    """Enhance one scene with a chat completion and cache the result"""
+    user_prompt = f"""Enhance this scene description for image generation:
             
             Style: {style}
             Base description: {base_prompt}
             
             Output ONLY the enhanced prompt, no explanations."""
-            
-            response = await client.chat.completions.create(
-                model=settings.openai_model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                max_tokens=300,
-                temperature=0.7,
-            )
-            
-            enhanced = response.choices[0].message.content or base_prompt
-            
-            if settings.debug_ai:
-                logger.info(f"🧠 OpenAI enhanced prompt: {enhanced}")
-                
-            return {
-                "prompt": enhanced,
-                "negative_prompt": "low quality, blurry, distorted, deformed, ugly, bad anatomy, extra limbs, watermark, text",
-                "style_tokens": [style, camera_angle, time_of_day],
-            }
-            
-        except Exception as e:
-            logger.warning(f"OpenAI enhancement failed, using fallback: {e}")
     
-    # Fallback: return basic enhancement
-    style_modifiers = {
-        "cinematic": "cinematic lighting, dramatic, professional photography, film grain",
-        "anime": "anime style, studio ghibli, vibrant colors, detailed animation",
-        "disney": "disney style, 3d animation, pixar-like, colorful, expressive",
-        "pixar": "pixar style, 3d rendered, soft lighting, expressive characters",
-        "noir": "film noir, black and white, high contrast, dramatic shadows",
-        "sketch": "pencil sketch, hand drawn, artistic, monochrome, detailed lines",
-    }
+    response = await complete(
+        client,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt},
+        ],
+        max_tokens=300,
+        temperature=0.7,
+    )
     
-    enhanced = f"{base_prompt}, {style_modifiers.get(style, '')}"
+    enhanced = response.choices[0].message.content or base_prompt
     
-    return {
+    if settings.debug_ai:
+        logger.info(f"🧠 OpenAI enhanced prompt: {enhanced}")
+    
+    result = {
         "prompt": enhanced,
-        "negative_prompt": "low quality, blurry, distorted, deformed, ugly, bad anatomy, watermark, text",
+        "negative_prompt": LLM_NEGATIVE_PROMPT,
         "style_tokens": [style, camera_angle, time_of_day],
     }
+    await store_prompt(cache_key, result)
+    return result
+
+
+async def _enhance_packed(client: AsyncOpenAI, items: list[dict]) -> list[dict]:
+    """
+    Enhance several short scenes with one structured chat completion
+    
+    Falls back to the template path for every item of the pack if the
+    completion fails, does not return one prompt per scene, or has not
+    answered within `prompt_latency_budget_seconds`; a late answer still
+    fills the cache.
+    """
+    started = time.perf_counter()
+    
+    def observe(source: str):
+        # Every scene of the pack waited for the same completion
+        elapsed = time.perf_counter() - started
+        for item in items:
+            PROMPT_ENHANCEMENT_TIME.labels(
+                style=style_label(item.get("style", "cinematic")), source=source
+            ).observe(elapsed)
+    
+    base_prompts = [
+        build_base_prompt(
+            item["description"],
+            item.get("characters"),
+            item.get("location"),
+            item.get("time_of_day", "day"),
+            item.get("camera_angle", "medium"),
+        )
+        for item in items
+    ]
+    
+    task = asyncio.create_task(_enhance_packed_llm(client, items, base_prompts))
+    try:
+        results = await asyncio.wait_for(
+            asyncio.shield(task),
+            timeout=settings.prompt_latency_budget_seconds or None,
+        )
+        observe("llm")
+        return results
+    except asyncio.TimeoutError:
+        _detach(task)
+        logger.warning(
+            f"Packed OpenAI enhancement exceeded {settings.prompt_latency_budget_seconds}s budget, using fallback"
+        )
+    except CircuitOpenError:
+        pass
+    except Exception as e:
+        logger.warning(f"Packed OpenAI enhancement failed, using fallback: {e}")
+    
+    results = [
+        template_prompt(
+            base,
+            item.get("style", "cinematic"),
+            item.get("camera_angle", "medium"),
+            item.get("time_of_day", "day"),
+        )
+        for item, base in zip(items, base_prompts)
+    ]
+    observe("template")
+    return results
+
+
+async def _enhance_packed_llm(
+    client: AsyncOpenAI,
+    items: list[dict],
+    base_prompts: list[str],
+) -> list[dict]:
+    """Enhance a pack of scenes with one chat completion and cache the results"""
+    scenes = "\n".join(
+        f"{i + 1}. Style: {item.get('style', 'cinematic')}. {base}"
+        for i, (item, base) in enumerate(zip(items, base_prompts))
+    )
+    user_prompt = f"""Enhance each of these scene descriptions for image generation:
+            
+            {scenes}
+            
+            Respond with a JSON object {{"prompts": [...]}} holding exactly one
+            enhanced prompt per scene, in the same order, no explanations."""
+    
+    response = await complete(
+        client,
+        scenes=len(items),
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt},
+        ],
+        max_tokens=300 * len(items),
+        temperature=0.7,
+        response_format={"type": "json_object"},
+    )
+    
+    enhanced = json.loads(response.choices[0].message.content or "{}")["prompts"]
+    if len(enhanced) != len(items) or not all(isinstance(p, str) for p in enhanced):
+        raise ValueError(f"expected {len(items)} prompts, got {len(enhanced)}")
+    
+    results = []
+    for item, prompt in zip(items, enhanced):
+        result = {
+            "prompt": prompt,
+            "negative_prompt": LLM_NEGATIVE_PROMPT,
+            "style_tokens": [
+                item.get("style", "cinematic"),
+                item.get("camera_angle", "medium"),
+                item.get("time_of_day", "day"),
+            ],
+        }
+        await store_prompt(_item_cache_key(item), result)
+        results.append(result)
+    return results
+
+
+def _item_cache_key(item: dict) -> str:
+    """Cache key for an enhance_prompt keyword-argument dict"""
+    return prompt_cache_key(
+        item["description"],
+        item.get("style", "cinematic"),
+        item.get("characters"),
+        item.get("location"),
+        item.get("time_of_day", "day"),
+        item.get("camera_angle", "medium"),
+    )
+
+
+async def enhance_prompts(items: list[dict]) -> list[dict]:
+    """
+    Enhance a whole storyboard of scene descriptions
+    
+    Cached scenes are answered directly. Short scenes are packed into
+    shared completions of up to `prompt_pack_size` scenes, longer ones
+    go through `enhance_prompt` on their own, and at most
+    `prompt_batch_concurrency` completions run at once.
+    
+    Args:
+        items: enhance_prompt keyword arguments, one dict per scene
+        
+    Returns:
+        Results in the same order as `items`
+    """
+    results: list[dict | None] = [None] * len(items)
+    client = init_client()
+    
+    if not client:
+        return [await enhance_prompt(**item) for item in items]
+    
+    # Answer cached scenes, sort the rest into packs and single calls
+    short: list[int] = []
+    single: list[int] = []
+    for i, item in enumerate(items):
+        cached = await get_cached_prompt(_item_cache_key(item))
+        if cached:
+            results[i] = cached
+        elif len(item["description"]) <= settings.prompt_pack_max_chars:
+            short.append(i)
+        else:
+            single.append(i)
+    
+    packs = [
+        short[start:start + settings.prompt_pack_size]
+        for start in range(0, len(short), settings.prompt_pack_size)
+    ]
+    # A pack of one is just a normal call
+    single += [pack[0] for pack in packs if len(pack) == 1]
+    packs = [pack for pack in packs if len(pack) > 1]
+    
+    semaphore = asyncio.Semaphore(settings.prompt_batch_concurrency)
+    
+    async def run_single(i: int):
+        async with semaphore:
+            results[i] = await enhance_prompt(**items[i])
+    
+    async def run_pack(pack: list[int]):
+        async with semaphore:
+            packed = await _enhance_packed(client, [items[i] for i in pack])
+        for i, result in zip(pack, packed):
+            results[i] = result
+    
+    await asyncio.gather(
+        *(run_single(i) for i in single),
+        *(run_pack(pack) for pack in packs),
+    )
+    
+    return results
@@ -2,43 +2,534 @@
 Redis queue manager for generation jobs
 """
 
+import asyncio
 import json
 import logging
+import time
 import uuid
-from typing import Any, Dict
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict
 import redis.asyncio as redis
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff, NoBackoff
 
 from config import settings
 
 logger = logging.getLogger(__name__)
 
+# Statuses that never change again (but see is_final for chained upscales)
+TERMINAL_STATUSES = {"completed", "failed", "superseded"}
+
+JOB_CACHE_SIZE = 1024
+
+JOB_TTL_SECONDS = 3600  # 1 hour
+
+# Jobs reaped from dead workers are dispatched ahead of both lanes
+GENERATION_QUEUE = "generation_queue"
+# Upscale jobs have their own queue so they never hold up drafts
+UPSCALE_QUEUE = "upscale_queue"
+# Wake-up tokens for workers blocked waiting on an empty queue
+QUEUE_SIGNAL = "generation_queue_signal"
+DISPATCH_COUNTER = "generation_dispatch_count"
+DELAYED_QUEUE = "generation_delayed"
+DEAD_LETTER_QUEUE = "generation_dead_letter"
+WORKERS_SET = "generation_workers"
+# Processing times of recently finished jobs, newest first
+RECENT_DURATIONS = "generation_durations"
+RECENT_DURATIONS_SIZE = 100
+# Longest a worker blocks on an empty queue before looking again
+BLOCK_TIMEOUT_SECONDS = 5
+
+# Statuses of jobs that have not started yet and may be superseded
+WAITING_STATUSES = ("queued", "retrying")
+# Statuses a dequeued job may start from; jobs returned by the reaper
+# are still "processing"
+STARTABLE_STATUSES = (*WAITING_STATUSES, "processing")
+
+# Priority lanes, highest priority first
+LANES = ("interactive", "bulk")
+DEFAULT_LANE = "interactive"
+
+# Pick the next job: reaped jobs first, then a weighted choice between
+# the interactive and bulk lanes, round-robin across tenants inside a lane.
+# The job is moved into the worker's processing list when one is given.
+# KEYS[1] = recovered queue, KEYS[2] = processing list or '',
+# KEYS[3] = dispatch counter
+# ARGV[1] = lane queue prefix, ARGV[2] = tenant ring prefix,
+# ARGV[3] = interactive lane weight
+DISPATCH_SCRIPT = """
+local function take(source)
+    if KEYS[2] ~= '' then
+        return redis.call('LMOVE', source, KEYS[2], 'RIGHT', 'LEFT')
+    end
+    return redis.call('RPOP', source)
+end
+
+local function take_from_lane(lane)
+    local ring = ARGV[2] .. lane
+    for _ = 1, redis.call('LLEN', ring) do
+        local tenant = redis.call('LMOVE', ring, ring, 'RIGHT', 'LEFT')
+        local queue = ARGV[1] .. lane .. ':' .. tenant
+        local job = take(queue)
+        if redis.call('LLEN', queue) == 0 then
+            redis.call('LREM', ring, 0, tenant)
+        end
+        if job then
+            return job
+        end
+    end
+    return false
+end
+
+local job = take(KEYS[1])
+if job then
+    return job
+end
+
+local lanes = {'interactive', 'bulk'}
+local turn = redis.call('INCR', KEYS[3])
+if turn % (tonumber(ARGV[3]) + 1) == 0 then
+    lanes = {'bulk', 'interactive'}
+end
+for _, lane in ipairs(lanes) do
+    job = take_from_lane(lane)
+    if job then
+        return job
+    end
+end
+return false
+"""
+
+# Move retries whose backoff has elapsed back onto their tenant's queue in
+# their lane (joining the tenant ring if needed), or onto the
+# upscale queue, waking up idle workers for promoted generation jobs
+# KEYS[1] = delayed sorted set, KEYS[2] = upscale queue, KEYS[3] = queue signal
+# ARGV[1] = current time, ARGV[2] = max jobs to move,
+# ARGV[3] = lane queue prefix, ARGV[4] = tenant ring prefix,
+# ARGV[5] = default lane
+PROMOTE_DELAYED_SCRIPT = """
+local function text(value)
+    if type(value) == 'string' and value ~= '' then
+        return value
+    end
+    return nil
+end
+
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+local woken = 0
+for _, payload in ipairs(due) do
+    redis.call('ZREM', KEYS[1], payload)
+    local job = cjson.decode(payload)
+    if job['type'] == 'upscale' then
+        redis.call('RPUSH', KEYS[2], payload)
+    else
+        local lane = text(job['priority']) or ARGV[5]
+        local tenant = text(job['user_id']) or text(job['project_id']) or 'default'
+        redis.call('LPUSH', ARGV[3] .. lane .. ':' .. tenant, payload)
+        local ring = ARGV[4] .. lane
+        if not redis.call('LPOS', ring, tenant) then
+            redis.call('LPUSH', ring, tenant)
+        end
+        woken = woken + 1
+    end
+end
+for _ = 1, woken do
+    redis.call('LPUSH', KEYS[3], 1)
+end
+if woken > 0 then
+    redis.call('LTRIM', KEYS[3], 0, 999)
+end
+return #due
+"""
+
+# Return a silent worker's in-flight jobs to the head of their queue,
+# waking up idle workers for returned generation jobs
+# KEYS[1] = heartbeat key, KEYS[2] = processing list,
+# KEYS[3] = generation queue, KEYS[4] = worker set, KEYS[5] = upscale queue,
+# KEYS[6] = queue signal
+# ARGV[1] = worker ID
+REAP_WORKER_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return -1
+end
+local moved = 0
+local job = redis.call('RPOP', KEYS[2])
+while job do
+    local target = KEYS[3]
+    if cjson.decode(job)['type'] == 'upscale' then
+        target = KEYS[5]
+    else
+        redis.call('LPUSH', KEYS[6], 1)
+    end
+    redis.call('RPUSH', target, job)
+    moved = moved + 1
+    job = redis.call('RPOP', KEYS[2])
+end
+redis.call('LTRIM', KEYS[6], 0, 999)
+redis.call('SREM', KEYS[4], ARGV[1])
+return moved
+"""
+
+# Add a tenant to a lane's ring unless it is already there, keeping its
+# place in the rotation so re-queuing never pushes it back
+# KEYS[1] = tenant ring
+# ARGV[1] = tenant
+JOIN_RING_SCRIPT = """
+if redis.call('LPOS', KEYS[1], ARGV[1]) then
+    return 0
+end
+redis.call('LPUSH', KEYS[1], ARGV[1])
+return 1
+"""
+
+# Make a job the latest of its scene, superseding the previous latest job
+# if it has not started yet. Returns the superseded job ID, or false.
+# KEYS[1] = scene key
+# ARGV[1] = new job ID, ARGV[2] = TTL, ARGV[3] = job key prefix,
+# ARGV[4] = job channel prefix, ARGV[5] = storyboard channel prefix
+SUPERSEDE_SCENE_SCRIPT = """
+local previous = redis.call('GET', KEYS[1])
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+if not previous or previous == ARGV[1] then
+    return false
+end
+local job_key = ARGV[3] .. previous
+local data = redis.call('GET', job_key)
+if not data then
+    return false
+end
+local job = cjson.decode(data)
+if job['status'] ~= 'queued' and job['status'] ~= 'retrying' then
+    return false
+end
+job['status'] = 'superseded'
+job['superseded_by'] = ARGV[1]
+local payload = cjson.encode(job)
+redis.call('SET', job_key, payload, 'EX', ARGV[2])
+redis.call('PUBLISH', ARGV[4] .. previous, payload)
+if type(job['project_id']) == 'string' then
+    redis.call('PUBLISH', ARGV[5] .. job['project_id'], payload)
+end
+return previous
+"""
+
+# Merge changed fields into a job record, refresh its TTL and publish the
+# result, all in one atomic round trip.
+# KEYS[1] = job key
+# ARGV[1] = JSON object of changed fields, ARGV[2] = TTL,
+# ARGV[3] = job channel, ARGV[4] = storyboard channel prefix,
+# ARGV[5] = JSON list of statuses the job must be in, or '' for any,
+# ARGV[6] = record to recreate an expired job from, or '' to leave it missing
+# Returns the updated record, or nil if the job is missing or not in an
+# expected status
+UPDATE_JOB_SCRIPT = """
+local data = redis.call('GET', KEYS[1])
+if not data then
+    if ARGV[6] == '' then
+        return nil
+    end
+    data = ARGV[6]
+end
+local job = cjson.decode(data)
+if ARGV[5] ~= '' then
+    local expected = false
+    for _, status in ipairs(cjson.decode(ARGV[5])) do
+        if job['status'] == status then
+            expected = true
+        end
+    end
+    if not expected then
+        return nil
+    end
+end
+for field, value in pairs(cjson.decode(ARGV[1])) do
+    job[field] = value
+end
+local payload = cjson.encode(job)
+redis.call('SET', KEYS[1], payload, 'EX', ARGV[2])
+redis.call('PUBLISH', ARGV[3], payload)
+if type(job['project_id']) == 'string' then
+    redis.call('PUBLISH', ARGV[4] .. job['project_id'], payload)
+end
+return payload
+"""
+
+
+JOB_CHANNEL_PREFIX = "job_events:"
+
+
+def job_channel(job_id: str) -> str:
+    """Pub/sub channel that receives a job's status updates"""
+    return f"{JOB_CHANNEL_PREFIX}{job_id}"
+
+
+LANE_QUEUE_PREFIX = "generation_queue:"
+TENANT_RING_PREFIX = "generation_tenants:"
+
+
+def lane_queue(lane: str, tenant: str) -> str:
+    """Queue of one tenant's jobs in a priority lane"""
+    return f"{LANE_QUEUE_PREFIX}{lane}:{tenant}"
+
+
+def tenant_ring(lane: str) -> str:
+    """Round-robin ring of tenants with queued jobs in a lane"""
+    return f"{TENANT_RING_PREFIX}{lane}"
+
+
+def is_final(job: Dict[str, Any]) -> bool:
+    """
+    Whether a job record will never change again
+    
+    A completed job whose chained upscale is still pending is not final
+    yet: the upscale writes `upscaled_url` (or `upscale_error`) onto it.
+    """
+    if job.get("status") not in TERMINAL_STATUSES:
+        return False
+    return not (
+        job["status"] == "completed"
+        and job.get("upscale_job_id")
+        and not job.get("upscaled_url")
+        and not job.get("upscale_error")
+    )
+
+
+def job_tenant(job: Dict[str, Any]) -> str:
+    """Who a job is scheduled fairly against: its user, else its storyboard"""
+    return job.get("user_id") or job.get("project_id") or "default"
+
+
+SCENE_LATEST_PREFIX = "scene_latest:"
+
+
+def scene_key(job: Dict[str, Any]) -> str | None:
+    """Key holding the latest generation job ID of a job's scene"""
+    if job.get("type") == "upscale" or not job.get("scene_id"):
+        return None
+    return f"{SCENE_LATEST_PREFIX}{job.get('project_id') or ''}:{job['scene_id']}"
+
+
+def processing_list(worker_id: str) -> str:
+    """List holding the jobs a worker is currently processing"""
+    return f"processing:{worker_id}"
+
+
+def heartbeat_key(worker_id: str) -> str:
+    """Key that exists while a worker is alive"""
+    return f"worker_heartbeat:{worker_id}"
+
+
+PROJECT_CHANNEL_PREFIX = "project_events:"
+
+
+def project_channel(project_id: str) -> str:
+    """Pub/sub channel that receives status updates for all jobs of a storyboard"""
+    return f"{PROJECT_CHANNEL_PREFIX}{project_id}"
+
+
+class QueueUnavailableError(Exception):
+    """Raised when a job cannot be queued because Redis is unreachable"""
+
+
+class JobEventHub:
+    """
+    Fan out job status events from one shared pub/sub connection
+    
+    A single pattern subscription per process receives every job and
+    storyboard event and hands it to the local subscribers of its channel,
+    so waiting clients never hold connections of the sized command pool.
+    The subscriber connects lazily and reconnects with backoff.
+    """
+    
+    def __init__(self):
+        self._subscribers: Dict[str, set[asyncio.Queue]] = {}
+        self._client: redis.Redis | None = None
+        self._task: asyncio.Task | None = None
+        self._ready = asyncio.Event()
+    
+    async def _run(self):
+        delay = settings.redis_reconnect_base_seconds
+        while True:
+            pubsub = self._client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{JOB_CHANNEL_PREFIX}*", f"{PROJECT_CHANNEL_PREFIX}*")
+                self._ready.set()
+                delay = settings.redis_reconnect_base_seconds
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    for queue in self._subscribers.get(message["channel"], ()):
+                        queue.put_nowait(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._ready.clear()
+                logger.warning(f"Job event subscriber lost, reconnecting in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, settings.redis_reconnect_max_seconds)
+            finally:
+                await asyncio.shield(pubsub.aclose())
+    
+    async def _start(self):
+        """Start the shared subscriber and wait until it is subscribed"""
+        if self._task is None or self._task.done():
+            self._ready.clear()
+            if self._client is None:
+                self._client = redis.Redis.from_url(
+                    settings.redis_url,
+                    socket_connect_timeout=settings.redis_connect_timeout_seconds,
+                    decode_responses=True,
+                )
+            self._task = asyncio.create_task(self._run())
+        
+        try:
+            await asyncio.wait_for(
+                self._ready.wait(), timeout=settings.redis_pool_timeout_seconds
+            )
+        except asyncio.TimeoutError:
+            raise QueueUnavailableError("Job event subscriber is not connected")
+    
+    @asynccontextmanager
+    async def subscribe(self, *channels: str) -> AsyncIterator[asyncio.Queue]:
+        """
+        Receive raw event payloads of `channels` on a queue
+        
+        Events published after entering the block are delivered.
+        
+        Raises:
+            QueueUnavailableError: The subscriber cannot connect to Redis
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        for channel in channels:
+            self._subscribers.setdefault(channel, set()).add(queue)
+        try:
+            await self._start()
+            yield queue
+        finally:
+            for channel in channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers:
+                    subscribers.discard(queue)
+                    if not subscribers:
+                        del self._subscribers[channel]
+    
+    async def close(self):
+        """Stop the shared subscriber"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
 
 class QueueManager:
     """Manage generation jobs in Redis queue"""
     
     def __init__(self):
         self.redis: redis.Redis | None = None
+        self.pool: redis.BlockingConnectionPool | None = None
+        self._last_connect_attempt = 0.0
+        # Whether the pool retries commands with backoff (workers only)
+        self._backoff = False
+        # Last queue_stats result and when it was taken
+        self._stats: tuple[float, Dict[str, Any]] | None = None
+        self._update_job_script = None
+        self._promote_delayed_script = None
+        self._reap_worker_script = None
+        self._dispatch_script = None
+        # Raw payloads of jobs held in processing lists, by job ID
+        self._in_flight: Dict[str, tuple[str, str]] = {}
+        # Read-through cache of finished jobs
+        self._job_cache: OrderedDict[str, Dict[str, Any]] = OrderedDict()
+        self.events = JobEventHub()
     
-    async def connect(self):
-        """Initialize Redis connection"""
+    async def connect(self, backoff: bool = False):
+        """
+        Initialize Redis connection pool
+        
+        Args:
+            backoff: Retry failed commands with exponential backoff. Only
+                workers want this; API requests retry a dropped pooled
+                connection once and then fail fast.
+        """
+        self._backoff = backoff
+        self._last_connect_attempt = time.monotonic()
+        if backoff:
+            retry = Retry(
+                ExponentialBackoff(
+                    cap=settings.redis_reconnect_max_seconds,
+                    base=settings.redis_reconnect_base_seconds,
+                ),
+                retries=3,
+            )
+            retry_on_error = [redis.ConnectionError, redis.TimeoutError]
+            # Blocking pops wait up to BLOCK_TIMEOUT_SECONDS for a reply
+            socket_timeout = BLOCK_TIMEOUT_SECONDS + settings.redis_socket_timeout_seconds
+        else:
+            retry = Retry(NoBackoff(), retries=1, supported_errors=(redis.ConnectionError,))
+            retry_on_error = [redis.ConnectionError]
+            socket_timeout = settings.redis_socket_timeout_seconds
         try:
-            self.redis = redis.Redis(
-                host=settings.redis_host,
-                port=settings.redis_port,
+            # Callers wait up to redis_pool_timeout_seconds for a free connection
+            self.pool = redis.BlockingConnectionPool.from_url(
+                settings.redis_url,
+                max_connections=settings.redis_max_connections,
+                timeout=settings.redis_pool_timeout_seconds,
+                socket_connect_timeout=settings.redis_connect_timeout_seconds,
+                socket_timeout=socket_timeout,
                 decode_responses=True,
+                # Reconnect transparently when a pooled connection drops
+                retry=retry,
+                retry_on_error=retry_on_error,
+                health_check_interval=30,
             )
+            self.redis = redis.Redis(connection_pool=self.pool)
             await self.redis.ping()
+            self._register_scripts()
             logger.info("✅ Redis connected")
         except Exception as e:
             logger.error(f"❌ Redis connection failed: {e}")
-            self.redis = None
+            await self.disconnect()
+    
+    def _register_scripts(self):
+        """Register the Lua scripts on the current Redis client"""
+        self._update_job_script = self.redis.register_script(UPDATE_JOB_SCRIPT)
+        self._promote_delayed_script = self.redis.register_script(PROMOTE_DELAYED_SCRIPT)
+        self._reap_worker_script = self.redis.register_script(REAP_WORKER_SCRIPT)
+        self._dispatch_script = self.redis.register_script(DISPATCH_SCRIPT)
     
     async def disconnect(self):
-        """Close Redis connection"""
+        """Close Redis connection pool"""
+        await self.events.close()
         if self.redis:
-            await self.redis.close()
+            await self.redis.aclose()
+            self.redis = None
+        if self.pool:
+            await self.pool.disconnect()
+            self.pool = None
             logger.info("Redis disconnected")
     
+    async def ensure_connected(self) -> bool:
+        """Reconnect if a previous attempt failed, at most once per second"""
+        if not self.redis and time.monotonic() - self._last_connect_attempt >= 1:
+            await self.connect(self._backoff)
+        return self.redis is not None
+    
+    async def ping(self) -> bool:
+        """Whether Redis is reachable through the pool"""
+        if not await self.ensure_connected():
+            return False
+        try:
+            return await self.redis.ping()
+        except redis.RedisError:
+            return False
+    
     async def queue_generation_job(self, job_data: Dict[str, Any]) -> str:
         """
         Add a generation job to the queue
@@ -49,73 +540,670 @@ class QueueManager:
         Returns:
             Job ID
         """
-        job_id = str(uuid.uuid4())
+        job_ids = await self.queue_generation_jobs([job_data])
+        return job_ids[0]
+    
+    async def queue_generation_jobs(self, jobs_data: list[Dict[str, Any]]) -> list[str]:
+        """
+        Add several generation jobs to the queue in one Redis round trip
         
-        job = {
-            "id": job_id,
-            "status": "queued",
-            **job_data,
-        }
+        All jobs are pushed inside a single MULTI/EXEC, so either every
+        job of the batch is queued or none is. Generation jobs go to
+        their `priority` lane (interactive by default) under their tenant;
+        upscale jobs (`type` "upscale") go to the upscale queue.
         
-        if self.redis:
-            # Add to processing queue
-            await self.redis.lpush("generation_queue", json.dumps(job))
+        A generation job becomes the latest job of its scene; older jobs of
+        the same scene that have not started yet are marked "superseded"
+        and skipped by workers.
+        
+        Args:
+            jobs_data: List of dictionaries with job parameters
             
-            # Store job details
-            await self.redis.set(
-                f"job:{job_id}",
-                json.dumps(job),
-                ex=3600,  # 1 hour TTL
-            )
+        Returns:
+            Job IDs, in the same order as `jobs_data`
+            
+        Raises:
+            QueueUnavailableError: Redis is not reachable
+        """
+        now = time.time()
+        jobs = [
+            {
+                "id": str(uuid.uuid4()),
+                "status": "queued",
+                **job_data,
+                "priority": job_data.get("priority") or DEFAULT_LANE,
+                "created_at": now,
+                "queued_at": now,
+            }
+            for job_data in jobs_data
+        ]
+        
+        if not await self.ensure_connected():
+            raise QueueUnavailableError("Redis is not connected")
+        
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                tenants = set()
+                superseding = []
+                for job in jobs:
+                    payload = json.dumps(job)
+                    
+                    if job.get("type") == "upscale":
+                        pipe.lpush(UPSCALE_QUEUE, payload)
+                    else:
+                        # Add to the tenant's queue in the job's lane
+                        lane, tenant = job["priority"], job_tenant(job)
+                        pipe.lpush(lane_queue(lane, tenant), payload)
+                        tenants.add((lane, tenant))
+                    
+                    # Store job details
+                    pipe.set(f"job:{job['id']}", payload, ex=JOB_TTL_SECONDS)
+                    
+                    self._add_job_event(pipe, job)
+                    
+                    # Replaces the scene's previous latest job, superseding it
+                    scene = scene_key(job)
+                    if scene:
+                        # Plain EVAL: a script call queued in MULTI cannot
+                        # recover from NOSCRIPT
+                        superseding.append((len(pipe), job["id"]))
+                        pipe.eval(
+                            SUPERSEDE_SCENE_SCRIPT,
+                            1,
+                            scene,
+                            job["id"],
+                            JOB_TTL_SECONDS,
+                            "job:",
+                            JOB_CHANNEL_PREFIX,
+                            PROJECT_CHANNEL_PREFIX,
+                        )
+                
+                # Make sure each tenant is in its lane's ring exactly once,
+                # without moving tenants that are already waiting their turn
+                for lane, tenant in tenants:
+                    pipe.eval(JOIN_RING_SCRIPT, 1, tenant_ring(lane), tenant)
+                
+                # Wake up idle workers
+                if tenants:
+                    pipe.lpush(QUEUE_SIGNAL, *range(len(jobs)))
+                    pipe.ltrim(QUEUE_SIGNAL, 0, 999)
+                results = await pipe.execute()
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            raise QueueUnavailableError(str(e)) from e
+        
+        for job in jobs:
+            logger.info(f"Job queued: {job['id']}")
         
-        logger.info(f"Job queued: {job_id}")
-        return job_id
+        for index, job_id in superseding:
+            if results[index]:
+                logger.info(f"Job superseded: {results[index]} by {job_id}")
+        
+        return [job["id"] for job in jobs]
+    
+    def _cache_job(self, job: Dict[str, Any]):
+        """Remember a finished job so later lookups skip Redis"""
+        if not is_final(job):
+            return
+        self._job_cache[job["id"]] = job
+        self._job_cache.move_to_end(job["id"])
+        while len(self._job_cache) > JOB_CACHE_SIZE:
+            self._job_cache.popitem(last=False)
     
     async def get_job_status(self, job_id: str) -> Dict[str, Any] | None:
         """Get status of a generation job"""
+        cached = self._job_cache.get(job_id)
+        if cached:
+            return cached
+        
         if not self.redis:
             return None
         
         job_data = await self.redis.get(f"job:{job_id}")
         if job_data:
-            return json.loads(job_data)
+            job = json.loads(job_data)
+            self._cache_job(job)
+            return job
         return None
     
+    async def wait_for_job_update(
+        self,
+        job_id: str,
+        since: str | None = None,
+        timeout: float = 30,
+    ) -> Dict[str, Any] | None:
+        """
+        Long-poll a job until its status differs from `since`
+        
+        Args:
+            job_id: Job ID
+            since: Last status seen by the caller (defaults to the current one)
+            timeout: Maximum seconds to wait
+            
+        Returns:
+            Latest job record, or None if the job does not exist
+        """
+        job = await self.get_job_status(job_id)
+        if not job or not self.redis or is_final(job):
+            return job
+        
+        # A completed job waiting for its upscale is also woken by the
+        # upscale result, which keeps the status
+        def waiting(job: Dict[str, Any]) -> bool:
+            return job["status"] == since and not is_final(job)
+        
+        since = since or job["status"]
+        if not waiting(job):
+            return job
+        
+        try:
+            async with self.events.subscribe(job_channel(job_id)) as events:
+                # Re-check after subscribing so an update in between is not missed
+                job = await self.get_job_status(job_id) or job
+                
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + timeout
+                while waiting(job):
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        payload = await asyncio.wait_for(events.get(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        break
+                    job = json.loads(payload)
+                    self._cache_job(job)
+        except QueueUnavailableError as e:
+            # Degrade to a plain status read, the client polls again
+            logger.warning(f"Long-poll unavailable for job {job_id}: {e}")
+        
+        return job
+    
     async def update_job_status(
         self,
         job_id: str,
         status: str,
         image_url: str | None = None,
         error_message: str | None = None,
-    ):
-        """Update job status"""
+        expected_status: tuple[str, ...] | None = None,
+        fallback: Dict[str, Any] | None = None,
+        **fields: Any,
+    ) -> Dict[str, Any] | None:
+        """
+        Update job status
+        
+        Only the changed fields are sent; they are merged into the stored
+        record, the TTL is refreshed and subscribers are notified in a
+        single atomic script call.
+        
+        Args:
+            job_id: Job ID
+            status: New status
+            image_url: Result image URL
+            error_message: Failure reason
+            expected_status: Only update a job currently in one of these statuses
+            fallback: Record to recreate the job from if its stored record
+                has expired, e.g. the dequeued payload
+            **fields: Any other job fields to set
+            
+        Returns:
+            Updated job record, or None if the job does not exist (and no
+            fallback was given) or is not in an expected status
+        """
+        if not self.redis:
+            return None
+        
+        changes = {"status": status, **fields}
+        if image_url:
+            changes["image_url"] = image_url
+        if error_message:
+            changes["error_message"] = error_message
+        
+        # Wakes up long-polling and streaming clients as well
+        payload = await self._update_job_script(
+            keys=[f"job:{job_id}"],
+            args=[
+                json.dumps(changes),
+                JOB_TTL_SECONDS,
+                job_channel(job_id),
+                PROJECT_CHANNEL_PREFIX,
+                json.dumps(expected_status) if expected_status else "",
+                json.dumps(fallback) if fallback else "",
+            ],
+        )
+        if not payload:
+            return None
+        
+        job = json.loads(payload)
+        self._cache_job(job)
+        return job
+    
+    async def supersede_job(
+        self,
+        job_id: str,
+        superseded_by: str,
+        expected_status: tuple[str, ...] = WAITING_STATUSES,
+    ) -> bool:
+        """
+        Mark a job as superseded by a newer job of the same scene
+        
+        Jobs that already started are left alone and finish normally.
+        
+        Args:
+            job_id: Job to supersede
+            superseded_by: Newer job of the same scene
+            expected_status: Statuses the job may be superseded from
+            
+        Returns:
+            Whether the job was superseded
+        """
+        job = await self.update_job_status(
+            job_id,
+            "superseded",
+            expected_status=expected_status,
+            superseded_by=superseded_by,
+        )
+        if job:
+            logger.info(f"Job superseded: {job_id} by {superseded_by}")
+        return job is not None
+    
+    async def skip_if_superseded(self, job: Dict[str, Any]) -> bool:
+        """
+        Drop a dequeued job if a newer job was queued for its scene
+        
+        The job is marked superseded (if it was not already) and removed
+        from the worker's processing list.
+        
+        Returns:
+            Whether the job was skipped
+        """
+        scene = scene_key(job)
+        if not scene or not self.redis:
+            return False
+        
+        latest = await self.redis.get(scene)
+        if not latest or latest == job["id"]:
+            return False
+        
+        # The dequeuing worker owns the job, so a reaped job whose record
+        # still says "processing" is superseded as well
+        await self.supersede_job(job["id"], latest, expected_status=STARTABLE_STATUSES)
+        await self.ack_job(job["id"])
+        return True
+    
+    def _add_job_event(self, pipe, job: Dict[str, Any]):
+        """Add publishes of a job record to a pipeline"""
+        payload = json.dumps(job)
+        pipe.publish(job_channel(job["id"]), payload)
+        if job.get("project_id"):
+            pipe.publish(project_channel(job["project_id"]), payload)
+    
+    async def stream_job_events(
+        self,
+        job_ids: list[str] | None = None,
+        project_id: str | None = None,
+        heartbeat: float = 15,
+    ) -> AsyncIterator[Dict[str, Any] | None]:
+        """
+        Stream status updates for a set of jobs or a whole storyboard
+        
+        Yields the current record of each requested job first, then every
+        update as it is published. Yields None after `heartbeat` idle seconds
+        so callers can keep the connection alive. A job-id stream ends once
+        every job has finished; a storyboard stream runs until cancelled.
+        
+        Args:
+            job_ids: Jobs to follow
+            project_id: Storyboard whose jobs to follow
+            heartbeat: Idle seconds between None keepalive yields
+            
+        Raises:
+            QueueUnavailableError: The event subscriber cannot connect
+        """
         if not self.redis:
             return
         
-        job_data = await self.get_job_status(job_id)
-        if job_data:
-            job_data["status"] = status
-            if image_url:
-                job_data["image_url"] = image_url
-            if error_message:
-                job_data["error_message"] = error_message
+        job_ids = job_ids or []
+        channels = [job_channel(job_id) for job_id in job_ids]
+        if project_id:
+            channels.append(project_channel(project_id))
+        if not channels:
+            return
+        
+        pending = set(job_ids)
+        async with self.events.subscribe(*channels) as events:
+            # Initial snapshot, taken after subscribing so nothing is missed
+            uncached = [job_id for job_id in job_ids if job_id not in self._job_cache]
+            stored = {}
+            if uncached:
+                records = await self.redis.mget([f"job:{job_id}" for job_id in uncached])
+                stored = dict(zip(uncached, records))
+            for job_id in job_ids:
+                job = self._job_cache.get(job_id)
+                if not job and stored.get(job_id):
+                    job = json.loads(stored[job_id])
+                    self._cache_job(job)
+                if not job:
+                    pending.discard(job_id)
+                    continue
+                if is_final(job):
+                    pending.discard(job_id)
+                yield job
             
-            await self.redis.set(
-                f"job:{job_id}",
-                json.dumps(job_data),
-                ex=3600,
-            )
+            while pending or project_id:
+                try:
+                    payload = await asyncio.wait_for(events.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                
+                job = json.loads(payload)
+                self._cache_job(job)
+                if is_final(job):
+                    pending.discard(job["id"])
+                yield job
     
-    async def dequeue_job(self) -> Dict[str, Any] | None:
-        """Get next job from queue (for worker processing)"""
+    async def dequeue_job(self, worker_id: str | None = None) -> Dict[str, Any] | None:
+        """
+        Get next job from queue (for worker processing)
+        
+        Recovered jobs come first, then the interactive lane gets
+        `interactive_lane_weight` picks for every bulk pick; inside a lane,
+        tenants are served round-robin so one large storyboard cannot
+        starve everyone else.
+        
+        In reliable-queue mode the job is atomically moved into the
+        worker's processing list and stays there until `ack_job`, so a
+        worker that dies mid-job does not lose it.
+        
+        Args:
+            worker_id: ID of the dequeuing worker (enables reliable mode)
+        """
         if not self.redis:
             return None
         
-        result = await self.redis.brpop("generation_queue", timeout=5)
+        processing = processing_list(worker_id) if worker_id and settings.reliable_queue else None
+        
+        job_data = await self._dispatch(processing)
+        if not job_data:
+            # Block until something is queued or a retry is due, then try again
+            await self.redis.brpop(QUEUE_SIGNAL, timeout=await self._signal_timeout())
+            await self.promote_delayed_jobs()
+            job_data = await self._dispatch(processing)
+        
+        if not job_data:
+            return None
+        
+        job = json.loads(job_data)
+        if processing:
+            self._in_flight[job["id"]] = (worker_id, job_data)
+        return job
+    
+    async def dequeue_upscale_job(self, worker_id: str | None = None) -> Dict[str, Any] | None:
+        """
+        Get next upscale job (for worker processing)
+        
+        Args:
+            worker_id: ID of the dequeuing worker (enables reliable mode)
+        """
+        if not self.redis:
+            return None
+        
+        if worker_id and settings.reliable_queue:
+            job_data = await self.redis.blmove(
+                UPSCALE_QUEUE,
+                processing_list(worker_id),
+                timeout=BLOCK_TIMEOUT_SECONDS,
+                src="RIGHT",
+                dest="LEFT",
+            )
+            if not job_data:
+                return None
+            job = json.loads(job_data)
+            self._in_flight[job["id"]] = (worker_id, job_data)
+            return job
+        
+        result = await self.redis.brpop(UPSCALE_QUEUE, timeout=BLOCK_TIMEOUT_SECONDS)
         if result:
             _, job_data = result
             return json.loads(job_data)
         return None
+    
+    async def _signal_timeout(self, limit: float = BLOCK_TIMEOUT_SECONDS) -> float:
+        """Seconds to block for a wake-up, capped at the next due retry"""
+        due = await self.redis.zrange(DELAYED_QUEUE, 0, 0, withscores=True)
+        if not due:
+            return limit
+        # BRPOP treats 0 as "forever", so never go below a millisecond
+        return min(limit, max(0.001, due[0][1] - time.time()))
+    
+    async def _dispatch(self, processing: str | None) -> str | None:
+        """Pick the next job by priority lane and tenant fairness"""
+        return await self._dispatch_script(
+            keys=[GENERATION_QUEUE, processing or "", DISPATCH_COUNTER],
+            args=[LANE_QUEUE_PREFIX, TENANT_RING_PREFIX, settings.interactive_lane_weight],
+        )
+    
+    async def retry_job(self, job: Dict[str, Any], delay: float, error: str | None = None):
+        """
+        Schedule a failed job to run again after `delay` seconds
+        
+        The job's retry counter is incremented on both the stored record
+        and the re-queued payload.
+        """
+        if not self.redis:
+            return
+        
+        retries = job.get("retries", 0) + 1
+        await self.update_job_status(
+            job["id"],
+            "retrying",
+            error_message=error,
+            retries=retries,
+        )
+        ready_at = time.time() + delay
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zadd(
+                DELAYED_QUEUE,
+                {
+                    json.dumps({
+                        **job,
+                        "status": "queued",
+                        "retries": retries,
+                        "queued_at": ready_at,
+                    }): ready_at,
+                },
+            )
+            # Wake up a blocked worker so it waits for this retry's due time
+            # instead of a timeout computed before the retry existed
+            pipe.lpush(QUEUE_SIGNAL, 1)
+            pipe.ltrim(QUEUE_SIGNAL, 0, 999)
+            await pipe.execute()
+    
+    async def promote_delayed_jobs(self, limit: int = 100) -> int:
+        """Move retries whose backoff has elapsed back into their lane"""
+        if not self.redis:
+            return 0
+        
+        return await self._promote_delayed_script(
+            keys=[DELAYED_QUEUE, UPSCALE_QUEUE, QUEUE_SIGNAL],
+            args=[time.time(), limit, LANE_QUEUE_PREFIX, TENANT_RING_PREFIX, DEFAULT_LANE],
+        )
+    
+    async def dead_letter_job(self, job: Dict[str, Any], error: str | None = None):
+        """Mark a job that exhausted its retries as failed and park it"""
+        if not self.redis:
+            return
+        
+        await self.update_job_status(job["id"], "failed", error_message=error)
+        await self.redis.lpush(
+            DEAD_LETTER_QUEUE,
+            json.dumps({**job, "status": "failed", "error_message": error}),
+        )
+
+    
+    async def queue_depth(self) -> Dict[str, int]:
+        """
+        Count waiting jobs
+        
+        Returns:
+            Job counts for recovered jobs, each priority lane, upscales
+            and delayed retries
+        """
+        if not self.redis:
+            return {}
+        
+        rings = {lane: await self.redis.lrange(tenant_ring(lane), 0, -1) for lane in LANES}
+        
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.llen(GENERATION_QUEUE)
+            pipe.zcard(DELAYED_QUEUE)
+            pipe.llen(UPSCALE_QUEUE)
+            for lane, tenants in rings.items():
+                for tenant in tenants:
+                    pipe.llen(lane_queue(lane, tenant))
+            recovered, delayed, upscale, *counts = await pipe.execute()
+        
+        depth = {"recovered": recovered, "delayed": delayed, "upscale": upscale}
+        for lane, tenants in rings.items():
+            depth[lane] = sum(counts[:len(tenants)])
+            counts = counts[len(tenants):]
+        return depth
+    
+    async def record_job_duration(self, seconds: float):
+        """Remember how long a job took, for drain time estimates"""
+        if not self.redis:
+            return
+        
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.lpush(RECENT_DURATIONS, round(seconds, 3))
+            pipe.ltrim(RECENT_DURATIONS, 0, RECENT_DURATIONS_SIZE - 1)
+            await pipe.execute()
+    
+    async def queue_stats(self, max_age: float = 0) -> Dict[str, Any]:
+        """
+        Summarize the backlog and estimate how long it takes to drain
+        
+        Args:
+            max_age: Reuse a previous result up to this many seconds old
+            
+        Returns:
+            Queue depth per lane, waiting and in-flight job counts, live
+            workers and their total concurrency, average recent job time,
+            and estimated wait in seconds for a new job in each lane
+            (None while it cannot be estimated)
+        """
+        now = time.monotonic()
+        if self._stats and now - self._stats[0] <= max_age:
+            return self._stats[1]
+        
+        if not self.redis:
+            return {}
+        
+        depth = await self.queue_depth()
+        worker_ids = list(await self.redis.smembers(WORKERS_SET))
+        
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.lrange(RECENT_DURATIONS, 0, -1)
+            for worker_id in worker_ids:
+                pipe.get(heartbeat_key(worker_id))
+                pipe.llen(processing_list(worker_id))
+            durations, *per_worker = await pipe.execute()
+        
+        capacity = sum(int(c) for c in per_worker[0::2] if c)
+        in_flight = sum(per_worker[1::2])
+        avg_job_seconds = (
+            sum(float(d) for d in durations) / len(durations) if durations else None
+        )
+        
+        # Jobs a new job waits behind: interactive skips the bulk lane
+        ahead = {
+            "interactive": depth.get("recovered", 0) + depth.get("interactive", 0),
+            "bulk": sum(depth.get(key, 0) for key in ("recovered", "interactive", "bulk")),
+        }
+        estimated_wait = {
+            lane: (
+                (count + in_flight) * avg_job_seconds / capacity
+                if capacity and avg_job_seconds is not None
+                else None
+            )
+            for lane, count in ahead.items()
+        }
+        
+        stats = {
+            "depth": depth,
+            "waiting": ahead["bulk"],
+            "in_flight": in_flight,
+            "workers": sum(1 for c in per_worker[0::2] if c),
+            "capacity": capacity,
+            "avg_job_seconds": avg_job_seconds,
+            "estimated_wait_seconds": estimated_wait,
+        }
+        self._stats = (now, stats)
+        return stats
+    
+    async def ack_job(self, job_id: str):
+        """Remove a finished job from its worker's processing list"""
+        in_flight = self._in_flight.pop(job_id, None)
+        if not in_flight or not self.redis:
+            return
+        
+        worker_id, job_data = in_flight
+        await self.redis.lrem(processing_list(worker_id), 1, job_data)
+    
+    async def heartbeat(self, worker_id: str, concurrency: int = 1):
+        """
+        Mark a worker as alive for the next `worker_heartbeat_ttl_seconds`
+        
+        The heartbeat stores the worker's concurrency so the total
+        processing capacity can be estimated.
+        """
+        if not self.redis:
+            return
+        
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(heartbeat_key(worker_id), concurrency, ex=settings.worker_heartbeat_ttl_seconds)
+            pipe.sadd(WORKERS_SET, worker_id)
+            await pipe.execute()
+    
+    async def _reap_worker(self, worker_id: str) -> int:
+        """Re-queue a worker's in-flight jobs if its heartbeat has expired"""
+        return await self._reap_worker_script(
+            keys=[
+                heartbeat_key(worker_id),
+                processing_list(worker_id),
+                GENERATION_QUEUE,
+                WORKERS_SET,
+                UPSCALE_QUEUE,
+                QUEUE_SIGNAL,
+            ],
+            args=[worker_id],
+        )
+    
+    async def reap_dead_workers(self) -> int:
+        """
+        Re-queue jobs held by workers that stopped sending heartbeats
+        
+        Returns:
+            Number of jobs re-queued
+        """
+        if not self.redis:
+            return 0
+        
+        requeued = 0
+        for worker_id in await self.redis.smembers(WORKERS_SET):
+            count = await self._reap_worker(worker_id)
+            if count > 0:
+                logger.warning(f"♻️ Re-queued {count} job(s) from dead worker {worker_id}")
+                requeued += count
+        return requeued
+    
+    async def unregister_worker(self, worker_id: str):
+        """Remove a stopping worker, returning anything it still holds to the queue"""
+        if not self.redis:
+            return
+        
+        await self.redis.delete(heartbeat_key(worker_id))
+        await self._reap_worker(worker_id)
 
 
 # Global instance
@@ -127,5 +1215,9 @@ async def queue_generation_job(job_data: Dict[str, Any]) -> str:
     return await queue_manager.queue_generation_job(job_data)
 
 
+async def queue_generation_jobs(jobs_data: list[Dict[str, Any]]) -> list[str]:
+    return await queue_manager.queue_generation_jobs(jobs_data)
+
+
 async def get_job_status(job_id: str) -> Dict[str, Any] | None:
     return await queue_manager.get_job_status(job_id)
@@ -0,0 +1,158 @@
+"""
+Provider rate limiter shared by every worker and API pod
+
+Each provider/model pair gets a token bucket (requests per second with a
+burst allowance) and an optional cap on concurrent calls, both kept in
+Redis so the limits hold however many replicas are running. Callers wait
+for capacity instead of failing with provider 429s.
+"""
+
+import asyncio
+import logging
+import random
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from config import settings
+from services.queue_manager import queue_manager
+
+logger = logging.getLogger(__name__)
+
+# Longest single sleep while waiting, so freed capacity is noticed quickly
+MAX_WAIT_STEP_SECONDS = 1.0
+
+# Take one token from the bucket and one concurrency lease, or neither.
+# Uses the Redis clock so replicas with skewed clocks share one timeline.
+# KEYS[1] = bucket hash, KEYS[2] = lease sorted set
+# ARGV[1] = tokens per second (0 = unlimited), ARGV[2] = burst,
+# ARGV[3] = max concurrent (0 = unlimited), ARGV[4] = lease ID,
+# ARGV[5] = lease TTL in seconds
+# Returns 0 when acquired, otherwise milliseconds to wait before retrying
+ACQUIRE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local max_concurrent = tonumber(ARGV[3])
+
+if max_concurrent > 0 then
+    -- Leases of processes that died expire on their own
+    redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+    if redis.call('ZCARD', KEYS[2]) >= max_concurrent then
+        local oldest = redis.call('ZRANGE', KEYS[2], 0, 0, 'WITHSCORES')
+        return math.max(1, math.ceil((tonumber(oldest[2]) - now) * 1000))
+    end
+end
+
+if rate > 0 then
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+    local tokens = tonumber(bucket[1]) or burst
+    local updated_at = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - updated_at) * rate)
+    if tokens < 1 then
+        return math.max(1, math.ceil((1 - tokens) / rate * 1000))
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens - 1, 'updated_at', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+end
+
+if max_concurrent > 0 then
+    redis.call('ZADD', KEYS[2], now + tonumber(ARGV[5]), ARGV[4])
+    redis.call('EXPIRE', KEYS[2], math.ceil(tonumber(ARGV[5])))
+end
+return 0
+"""
+
+
+def provider_limits(provider: str) -> tuple[float, int, int]:
+    """Requests per second, burst and max concurrent calls of a provider"""
+    return (
+        getattr(settings, f"{provider}_requests_per_second", 0),
+        getattr(settings, f"{provider}_burst", 1),
+        getattr(settings, f"{provider}_max_concurrent", 0),
+    )
+
+
+class RateLimiter:
+    """Redis-backed token bucket and concurrency limiter"""
+    
+    def __init__(self):
+        self._script = None
+        self._script_redis = None
+    
+    def _acquire_script(self):
+        """Register the acquire script on the current Redis client"""
+        if self._script_redis is not queue_manager.redis:
+            self._script = queue_manager.redis.register_script(ACQUIRE_SCRIPT)
+            self._script_redis = queue_manager.redis
+        return self._script
+    
+    async def acquire(self, provider: str, model: str, lease_id: str) -> bool:
+        """
+        Wait until a call to `provider`/`model` is allowed
+        
+        Fails open: without Redis, or when Redis errors, the call goes
+        ahead unlimited rather than failing the job.
+        
+        Returns:
+            Whether a concurrency lease was taken and must be released
+        """
+        rate, burst, max_concurrent = provider_limits(provider)
+        if not settings.rate_limit_enabled or (rate <= 0 and max_concurrent <= 0):
+            return False
+        
+        waited = 0.0
+        while True:
+            if not queue_manager.redis:
+                return False
+            
+            try:
+                wait_ms = await self._acquire_script()(
+                    keys=[f"rate_limit:{provider}:{model}", f"rate_limit_leases:{provider}:{model}"],
+                    args=[rate, max(burst, 1), max_concurrent, lease_id, settings.rate_limit_lease_seconds],
+                )
+            except Exception as e:
+                logger.warning(f"Rate limiter unavailable, calling {provider} unlimited: {e}")
+                return False
+            
+            if not wait_ms:
+                if waited:
+                    logger.info(f"⏳ Waited {waited:.1f}s for {provider} capacity")
+                return max_concurrent > 0
+            
+            # Jitter keeps waiting replicas from retrying in lockstep
+            delay = min(wait_ms / 1000, MAX_WAIT_STEP_SECONDS) * random.uniform(1, 1.2)
+            await asyncio.sleep(delay)
+            waited += delay
+    
+    async def release(self, provider: str, model: str, lease_id: str):
+        """Give back a concurrency lease"""
+        if not queue_manager.redis:
+            return
+        try:
+            await queue_manager.redis.zrem(f"rate_limit_leases:{provider}:{model}", lease_id)
+        except Exception as e:
+            # The lease expires after `rate_limit_lease_seconds` anyway
+            logger.warning(f"Failed to release {provider} rate limit lease: {e}")
+    
+    @asynccontextmanager
+    async def limit(self, provider: str, model: str) -> AsyncIterator[None]:
+        """
+        Hold provider capacity for the duration of the block
+        
+        Example:
+            async with rate_limiter.limit("openai", settings.openai_model):
+                response = await client.chat.completions.create(...)
+        """
+        lease_id = str(uuid.uuid4())
+        leased = await self.acquire(provider, model, lease_id)
+        try:
+            yield
+        finally:
+            if leased:
+                await asyncio.shield(self.release(provider, model, lease_id))
+
+
+# Global instance
+rate_limiter = RateLimiter()
@@ -0,0 +1,99 @@
+"""
+Content-addressed cache of image generation results
+"""
+
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from config import settings
+from services.queue_manager import queue_manager
+
+logger = logging.getLogger(__name__)
+
+INDEX_KEY = "result_cache:index"
+
+
+def result_cache_key(
+    full_prompt: str,
+    full_negative: str,
+    width: int,
+    height: int,
+    model_version: str,
+    seed: Optional[int] = None,
+    num_outputs: int = 1,
+) -> str:
+    """
+    Build a cache key from the fully resolved generation inputs
+    
+    Returns:
+        Redis key derived from a SHA-256 of the canonical inputs
+    """
+    canonical = json.dumps(
+        {
+            "prompt": full_prompt,
+            "negative_prompt": full_negative,
+            "width": width,
+            "height": height,
+            "model_version": model_version,
+            "seed": seed,
+            "num_outputs": num_outputs,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    digest = hashlib.sha256(canonical.encode()).hexdigest()
+    return f"result_cache:{digest}"
+
+
+async def get_cached_result(key: str) -> Dict[str, Any] | None:
+    """Look up a cached generation result"""
+    if not settings.result_cache_enabled or not queue_manager.redis:
+        return None
+    
+    try:
+        data = await queue_manager.redis.get(key)
+    except Exception as e:
+        logger.warning(f"Result cache lookup failed: {e}")
+        return None
+    
+    return json.loads(data) if data else None
+
+
+async def store_result(key: str, result: Dict[str, Any]):
+    """
+    Store a successful generation result
+    
+    Entries expire after `result_cache_ttl_seconds`, or after the shorter
+    `result_cache_unmirrored_ttl_seconds` while they still point at the
+    provider's expiring URLs; once the cache holds more than
+    `result_cache_max_entries`, the oldest entries are evicted.
+    """
+    if not settings.result_cache_enabled or not queue_manager.redis:
+        return
+    
+    ttl = settings.result_cache_ttl_seconds
+    if not result.get("mirrored"):
+        ttl = min(ttl, settings.result_cache_unmirrored_ttl_seconds)
+    
+    try:
+        async with queue_manager.redis.pipeline(transaction=True) as pipe:
+            pipe.set(key, json.dumps(result), ex=ttl)
+            pipe.zadd(INDEX_KEY, {key: time.time()})
+            # Drop index entries whose values have already expired
+            pipe.zremrangebyscore(
+                INDEX_KEY, "-inf", time.time() - settings.result_cache_ttl_seconds
+            )
+            pipe.zcard(INDEX_KEY)
+            *_, size = await pipe.execute()
+        
+        overflow = size - settings.result_cache_max_entries
+        if overflow > 0:
+            evicted = await queue_manager.redis.zpopmin(INDEX_KEY, overflow)
+            keys = [member for member, _ in evicted]
+            if keys:
+                await queue_manager.redis.delete(*keys)
+    except Exception as e:
+        logger.warning(f"Result cache store failed: {e}")
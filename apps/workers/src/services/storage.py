@@ -0,0 +1,80 @@
+"""
+Object storage for generated images (local filesystem or S3-compatible)
+"""
+
+import asyncio
+import logging
+from pathlib import Path
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def local_public_url() -> str:
+    """Public URL of `storage_local_path`: the API's /media mount by default"""
+    return settings.storage_public_url or f"{settings.api_url.rstrip('/')}/media"
+
+
+class LocalStorage:
+    """Store objects on the local filesystem, served under a public URL"""
+    
+    def __init__(self, root: str, public_url: str):
+        self.root = Path(root)
+        self.public_url = public_url.rstrip("/")
+    
+    def _write(self, key: str, data: bytes):
+        path = self.root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    
+    async def put(self, key: str, data: bytes, content_type: str) -> str:
+        """Store an object and return its public URL"""
+        await asyncio.to_thread(self._write, key, data)
+        return f"{self.public_url}/{key}"
+
+
+class S3Storage:
+    """Store objects in an S3-compatible bucket (requires boto3)"""
+    
+    def __init__(self):
+        import boto3
+        
+        self.bucket = settings.s3_bucket
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.s3_endpoint_url,
+            region_name=settings.s3_region,
+            aws_access_key_id=settings.s3_access_key_id,
+            aws_secret_access_key=settings.s3_secret_access_key,
+        )
+        self.public_url = (
+            settings.storage_public_url
+            or f"{settings.s3_endpoint_url or 'https://s3.amazonaws.com'}/{self.bucket}"
+        ).rstrip("/")
+    
+    async def put(self, key: str, data: bytes, content_type: str) -> str:
+        """Store an object and return its public URL"""
+        await asyncio.to_thread(
+            self.client.put_object,
+            Bucket=self.bucket,
+            Key=key,
+            Body=data,
+            ContentType=content_type,
+            CacheControl="public, max-age=31536000, immutable",
+        )
+        return f"{self.public_url}/{key}"
+
+
+_storage: LocalStorage | S3Storage | None = None
+
+
+def get_storage() -> LocalStorage | S3Storage | None:
+    """Get the configured object store, or None when mirroring is disabled"""
+    global _storage
+    if _storage is None:
+        if settings.storage_backend == "local":
+            _storage = LocalStorage(settings.storage_local_path, local_public_url())
+        elif settings.storage_backend == "s3":
+            _storage = S3Storage()
+    return _storage
@@ -5,12 +5,33 @@ Processes generation jobs from Redis queue
 
 import asyncio
 import logging
+import os
+import random
 import signal
+import socket
 import sys
+import time
+import uuid
+
+from prometheus_client import start_http_server
+
+from redis.exceptions import RedisError
 
 from config import settings
-from services.queue_manager import queue_manager
-from services.image_generator import generate_image
+from services.queue_manager import STARTABLE_STATUSES, queue_manager
+from services import postprocess
+from services.image_backends import close_client
+from services.image_generator import generate_image, upscale_image
+from services.metrics import (
+    JOB_TIME,
+    JOBS,
+    JOBS_IN_FLIGHT,
+    QUEUE_WAIT,
+    aspect_ratio_label,
+    set_queue_depth,
+    style_label,
+)
+from services.result_cache import store_result
 
 logging.basicConfig(
     level=logging.INFO,
@@ -20,51 +41,189 @@ logger = logging.getLogger(__name__)
 
 
 class Worker:
-    """Background worker for processing generation jobs"""
+    """Background worker for processing generation and upscale jobs"""
     
-    def __init__(self):
+    def __init__(self, concurrency: int | None = None):
         self.running = True
+        self.concurrency = concurrency or settings.max_concurrent_generations
+        self._slots = asyncio.Semaphore(self.concurrency)
+        # Upscales run in their own pool so they never block drafts
+        self._upscale_slots = asyncio.Semaphore(settings.max_concurrent_upscales)
+        self._tasks: set[asyncio.Task] = set()
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stopping = asyncio.Event()
+        self._dequeue_tasks: set[asyncio.Task] = set()
+        self._reconnect_delay = settings.redis_reconnect_base_seconds
         
     def shutdown(self, signum=None, frame=None):
         """Graceful shutdown"""
-        logger.info("Received shutdown signal, finishing current job...")
+        logger.info(
+            f"Received shutdown signal, finishing {len(self._tasks)} in-flight job(s)..."
+        )
         self.running = False
+        self._stopping.set()
+        
+        # Interrupt blocking pops instead of waiting for their timeout
+        for task in self._dequeue_tasks:
+            task.cancel()
+    
+    async def sleep(self, seconds: float):
+        """Sleep that returns early on shutdown"""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+    
+    async def connect(self):
+        """Connect to Redis, retrying with exponential backoff until shutdown"""
+        delay = settings.redis_reconnect_base_seconds
+        while self.running:
+            await queue_manager.connect(backoff=True)
+            if queue_manager.redis:
+                return
+            
+            logger.warning(f"Retrying Redis connection in {delay:.1f}s...")
+            await self.sleep(delay)
+            delay = min(delay * 2, settings.redis_reconnect_max_seconds)
+    
+    async def next_job(self, dequeue) -> dict | None:
+        """
+        Block until the next job is available
+        
+        Returns None when interrupted by shutdown or after a Redis error,
+        in which case it backs off before returning.
+        
+        Args:
+            dequeue: Coroutine function that pops the next job
+        """
+        task = asyncio.create_task(dequeue())
+        self._dequeue_tasks.add(task)
+        try:
+            job = await task
+            self._reconnect_delay = settings.redis_reconnect_base_seconds
+            return job
+        except asyncio.CancelledError:
+            if self.running:
+                raise
+            return None
+        except RedisError as e:
+            logger.warning(f"Redis error while dequeuing, retrying in {self._reconnect_delay:.1f}s: {e}")
+            await self.sleep(self._reconnect_delay)
+            self._reconnect_delay = min(
+                self._reconnect_delay * 2, settings.redis_reconnect_max_seconds
+            )
+            return None
+        finally:
+            self._dequeue_tasks.discard(task)
+    
+    async def _dequeue(self) -> dict | None:
+        """Promote due retries, then pop the next generation job"""
+        await queue_manager.promote_delayed_jobs()
+        job = await queue_manager.dequeue_job(self.worker_id)
+        
+        # A newer job was queued for the same scene, don't render this one
+        if job and await queue_manager.skip_if_superseded(job):
+            JOBS.labels(status="superseded").inc()
+            return None
+        return job
+    
+    async def _dequeue_upscale(self) -> dict | None:
+        """Pop the next upscale job"""
+        return await queue_manager.dequeue_upscale_job(self.worker_id)
+    
+    def _spawn(self, job: dict, slots: asyncio.Semaphore):
+        """Run a job in the background, releasing its slot when done"""
+        task = asyncio.create_task(self.process_job(job))
+        self._tasks.add(task)
+        generation = job.get("type", "generate") == "generate"
+        if generation:
+            JOBS_IN_FLIGHT.inc()
+        
+        def _done(t: asyncio.Task):
+            self._tasks.discard(t)
+            slots.release()
+            if generation:
+                JOBS_IN_FLIGHT.dec()
+        
+        task.add_done_callback(_done)
+    
+    async def consume(self, slots: asyncio.Semaphore, dequeue):
+        """Keep taking jobs while slots are free, until shutdown"""
+        while self.running:
+            # Backpressure: only dequeue when a slot is free
+            await slots.acquire()
+            if not self.running:
+                slots.release()
+                break
+            
+            try:
+                job = await self.next_job(dequeue)
+            except BaseException:
+                slots.release()
+                raise
+            
+            if job:
+                self._spawn(job, slots)
+            else:
+                slots.release()
+    
+    async def heartbeat_loop(self):
+        """Keep this worker's heartbeat alive and reap workers that died
+
+        Runs until shutdown *and* drain: in-flight jobs must stay owned by this
+        worker, or peers would reap them and render them a second time.
+        """
+        while self.running or self._tasks:
+            try:
+                await queue_manager.heartbeat(self.worker_id, self.concurrency)
+                await queue_manager.reap_dead_workers()
+                set_queue_depth(await queue_manager.queue_depth())
+            except Exception as e:
+                logger.warning(f"Heartbeat failed: {e}")
+            if self.running:
+                await self.sleep(settings.worker_heartbeat_interval_seconds)
+            else:
+                # Shutdown already fired, so self.sleep() would return at once
+                await asyncio.sleep(settings.worker_heartbeat_interval_seconds)
+    
+    async def drain(self):
+        """Wait for all in-flight jobs to finish"""
+        if self._tasks:
+            logger.info(f"Draining {len(self._tasks)} in-flight job(s)...")
+            await asyncio.gather(*self._tasks, return_exceptions=True)
     
     async def process_job(self, job: dict):
-        """Process a single generation job"""
+        """Process a single job of any type"""
         job_id = job.get("id")
+        job_type = job.get("type", "generate")
         scene_id = job.get("scene_id")
-        prompt = job.get("prompt")
+        labels = {
+            "style": style_label(job.get("style", "cinematic")),
+            "aspect_ratio": aspect_ratio_label(job.get("aspect_ratio", "16:9")),
+        }
+        outcome = "failed"
         
-        logger.info(f"Processing job {job_id} for scene {scene_id}")
+        logger.info(f"Processing {job_type} job {job_id} for scene {scene_id}")
+        # Upscales have no style of their own and would skew the generation metrics
+        generation = job_type == "generate"
+        if generation and job.get("queued_at"):
+            QUEUE_WAIT.labels(**labels).observe(time.time() - job["queued_at"])
         
         try:
-            # Update status to processing
-            await queue_manager.update_job_status(job_id, "processing")
-            
-            # Generate image
-            result = await generate_image(
-                prompt=prompt,
-                negative_prompt=job.get("negative_prompt"),
-                style=job.get("style", "cinematic"),
-                aspect_ratio=job.get("aspect_ratio", "16:9"),
-                character_embedding=job.get("character_embedding"),
+            # Claim the job, unless it was superseded since it was dequeued.
+            # A job that outwaited its record's TTL is recreated from its payload.
+            claimed = await queue_manager.update_job_status(
+                job_id, "processing", expected_status=STARTABLE_STATUSES, fallback=job
             )
+            if not claimed:
+                logger.info(f"Skipping job {job_id}, no longer waiting to run")
+                outcome = "superseded"
+                return
             
-            if result["success"]:
-                await queue_manager.update_job_status(
-                    job_id,
-                    "completed",
-                    image_url=result["image_url"],
-                )
-                logger.info(f"✅ Job {job_id} completed: {result['image_url']}")
+            if job_type == "upscale":
+                outcome = await self.upscale(job)
             else:
-                await queue_manager.update_job_status(
-                    job_id,
-                    "failed",
-                    error_message=result.get("error"),
-                )
-                logger.error(f"❌ Job {job_id} failed: {result.get('error')}")
+                outcome = await self.generate(job)
                 
         except Exception as e:
             logger.exception(f"Job {job_id} error: {e}")
@@ -73,30 +232,233 @@ class Worker:
                 "failed",
                 error_message=str(e),
             )
+        finally:
+            await queue_manager.ack_job(job_id)
+            
+            if generation:
+                JOBS.labels(status=outcome).inc()
+            if generation and outcome != "retrying" and job.get("created_at"):
+                JOB_TIME.labels(**labels, status=outcome).observe(
+                    time.time() - job["created_at"]
+                )
+    
+    async def generate(self, job: dict) -> str:
+        """
+        Run a generation job, chaining an upscale when requested
+        
+        Returns:
+            Outcome: "completed", "retrying", "dead_letter" or "failed"
+        """
+        job_id = job.get("id")
+        started = time.monotonic()
+        
+        # Generate image (times out on its own once provider capacity is acquired)
+        result = await generate_image(
+            prompt=job.get("prompt"),
+            negative_prompt=job.get("negative_prompt"),
+            style=job.get("style", "cinematic"),
+            aspect_ratio=job.get("aspect_ratio", "16:9"),
+            character_id=job.get("character_id"),
+            project_id=job.get("project_id"),
+            seed=job.get("seed"),
+            force_regenerate=job.get("force_regenerate", False),
+            variants=job.get("variants", 1),
+        )
+        
+        if not result["success"]:
+            return await self.handle_failure(
+                job, result.get("error"), result.get("retryable", False)
+            )
+        
+        results = await self.mirror(job_id, result)
+        first = results[0]
+        
+        # Final-export storyboards get an upscale of the first image queued right away
+        extra = {}
+        if job.get("upscale"):
+            try:
+                extra["upscale_job_id"] = await queue_manager.queue_generation_job({
+                    "type": "upscale",
+                    "parent_job_id": job_id,
+                    "image_url": first["image_url"],
+                    "scene_id": job.get("scene_id"),
+                    "project_id": job.get("project_id"),
+                    "user_id": job.get("user_id"),
+                    "style": job.get("style"),
+                    "aspect_ratio": job.get("aspect_ratio"),
+                })
+            except Exception as e:
+                logger.warning(f"Failed to queue upscale for job {job_id}: {e}")
+        
+        await queue_manager.update_job_status(
+            job_id,
+            "completed",
+            results=results,
+            **{k: v for k, v in first.items() if k not in ("seed", "index")},
+            **extra,
+        )
+        logger.info(f"✅ Job {job_id} completed: {len(results)} image(s), {first['image_url']}")
+        
+        # Drain estimates cover real predictions only; cache hits take
+        # milliseconds and would make the backlog look far cheaper
+        if not result.get("cached"):
+            await queue_manager.record_job_duration(time.monotonic() - started)
+        return "completed"
+    
+    async def upscale(self, job: dict) -> str:
+        """
+        Run an upscale job and attach the result to its parent job
+        
+        Returns:
+            Outcome: "completed", "retrying", "dead_letter" or "failed"
+        """
+        job_id = job.get("id")
+        
+        result = await upscale_image(job["image_url"])
+        
+        if not result["success"]:
+            outcome = await self.handle_failure(
+                job, result.get("error"), result.get("retryable", False)
+            )
+            # Let the parent's watchers know no upscaled_url is coming
+            if outcome != "retrying" and job.get("parent_job_id"):
+                await queue_manager.update_job_status(
+                    job["parent_job_id"],
+                    "completed",
+                    upscale_error=result.get("error") or "Upscale failed",
+                )
+            return outcome
+        
+        [urls] = await self.mirror(job_id, {"images": [{"image_url": result["image_url"]}]})
+        await queue_manager.update_job_status(job_id, "completed", **urls)
+        
+        if job.get("parent_job_id"):
+            await queue_manager.update_job_status(
+                job["parent_job_id"],
+                "completed",
+                upscaled_url=urls["image_url"],
+            )
+        
+        logger.info(f"✅ Upscale job {job_id} completed: {urls['image_url']}")
+        return "completed"
+    
+    async def mirror(self, job_id: str, result: dict) -> list[dict]:
+        """
+        Mirror generated images to object storage with web variants
+        
+        Cached results that were mirrored before are reused as is. If no
+        store is configured or mirroring fails, the provider URL is kept.
+        
+        Returns:
+            One entry per image: "image_url", "source_url", "seed" and
+            "index", plus "webp_url" and "thumbnail_url" when mirrored
+        """
+        images = result["images"]
+        if result.get("mirrored"):
+            return images
+        
+        async def mirror_one(image: dict) -> dict | None:
+            # Multi-variant jobs store each image under its own prefix
+            prefix = job_id if len(images) == 1 else f"{job_id}/{image['index']}"
+            try:
+                return await postprocess.mirror_image(prefix, image["image_url"])
+            except Exception as e:
+                logger.warning(f"Failed to mirror image for job {job_id}, keeping provider URL: {e}")
+                return None
+        
+        mirrored = await asyncio.gather(*(mirror_one(image) for image in images))
+        results = [
+            {**image, "source_url": image["image_url"], **(urls or {})}
+            for image, urls in zip(images, mirrored)
+        ]
+        
+        # Point the result cache at the durable copies
+        if result.get("cache_key") and all(mirrored):
+            cached = {
+                k: v for k, v in result.items() if k not in ("cache_key", "cached")
+            }
+            await store_result(
+                result["cache_key"],
+                {**cached, "image_url": results[0]["image_url"], "images": results, "mirrored": True},
+            )
+        
+        return results
+    
+    async def handle_failure(self, job: dict, error: str | None, retryable: bool) -> str:
+        """
+        Retry a transient failure with backoff, or fail the job for good
+        
+        Returns:
+            Outcome: "retrying", "dead_letter" or "failed"
+        """
+        job_id = job.get("id")
+        retries = job.get("retries", 0)
+        
+        if not retryable:
+            await queue_manager.update_job_status(
+                job_id,
+                "failed",
+                error_message=error,
+            )
+            logger.error(f"❌ Job {job_id} failed: {error}")
+            return "failed"
+        elif retries < settings.max_retries:
+            # Exponential backoff with jitter
+            delay = min(
+                settings.retry_backoff_max_seconds,
+                settings.retry_backoff_base_seconds * 2 ** retries,
+            ) * random.uniform(0.5, 1.0)
+            await queue_manager.retry_job(job, delay, error)
+            logger.warning(
+                f"🔁 Job {job_id} failed ({error}), retry {retries + 1}/{settings.max_retries} in {delay:.1f}s"
+            )
+            return "retrying"
+        else:
+            await queue_manager.dead_letter_job(job, error)
+            logger.error(f"❌ Job {job_id} exhausted retries, moved to dead-letter queue: {error}")
+            return "dead_letter"
     
     async def run(self):
         """Main worker loop"""
         # Setup signal handlers
-        signal.signal(signal.SIGINT, self.shutdown)
-        signal.signal(signal.SIGTERM, self.shutdown)
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGINT, self.shutdown)
+        loop.add_signal_handler(signal.SIGTERM, self.shutdown)
+        
+        # Expose Prometheus metrics
+        if settings.worker_metrics_port:
+            start_http_server(settings.worker_metrics_port)
+            logger.info(f"📈 Metrics on :{settings.worker_metrics_port}/metrics")
         
         # Connect to Redis
-        await queue_manager.connect()
+        await self.connect()
+        
+        # Announce ourselves before taking jobs so we are not reaped
+        await queue_manager.heartbeat(self.worker_id, self.concurrency)
+        heartbeat = asyncio.create_task(self.heartbeat_loop())
         
-        logger.info("👷 Worker started, waiting for jobs...")
+        logger.info(
+            f"👷 Worker {self.worker_id} started ({self.concurrency} concurrent jobs, "
+            f"{settings.max_concurrent_upscales} upscales), waiting for jobs..."
+        )
         
         try:
-            while self.running:
-                # Get next job from queue
-                job = await queue_manager.dequeue_job()
-                
-                if job:
-                    await self.process_job(job)
-                else:
-                    # No jobs, wait a bit
-                    await asyncio.sleep(1)
+            consumers = [self.consume(self._slots, self._dequeue)]
+            if settings.max_concurrent_upscales:
+                consumers.append(self.consume(self._upscale_slots, self._dequeue_upscale))
+            await asyncio.gather(*consumers)
         finally:
+            # Let in-flight jobs finish before closing Redis; the heartbeat
+            # keeps running meanwhile so peers do not reap them
+            await self.drain()
+            
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+            await queue_manager.unregister_worker(self.worker_id)
+            
             # Cleanup
+            await close_client()
+            await postprocess.close_client()
             await queue_manager.disconnect()
             logger.info("Worker stopped")
 
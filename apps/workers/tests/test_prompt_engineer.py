@@ -0,0 +1,97 @@
+"""
+Prompt engineering tests with a fake OpenAI client
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from prometheus_client import REGISTRY
+
+from config import settings
+from services import prompt_engineer
+from services.circuit_breaker import CircuitBreaker
+
+
+class FakeClient:
+    """OpenAI client whose completions wait until released"""
+    
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=self)
+        self.pending: list[asyncio.Future] = []
+    
+    async def create(self, **kwargs):
+        answer = asyncio.get_running_loop().create_future()
+        self.pending.append(answer)
+        content = await answer
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))]
+        )
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = CircuitBreaker("openai", failure_threshold=1, reset_seconds=30)
+    monkeypatch.setattr(prompt_engineer, "_breaker", breaker)
+    monkeypatch.setattr(settings, "prompt_hedge_after_seconds", 0)
+    return breaker
+
+
+async def test_call_from_before_half_open_keeps_probe_in_flight(breaker):
+    client = FakeClient()
+    messages = [{"role": "user", "content": "A lighthouse"}]
+    
+    # Started while the circuit was closed
+    early = asyncio.create_task(prompt_engineer.complete(client, messages=messages))
+    await asyncio.sleep(0)
+    
+    # The circuit has since opened and its reset time has passed
+    breaker.opened_at = time.monotonic() - breaker.reset_seconds - 1
+    probe = asyncio.create_task(prompt_engineer.complete(client, messages=messages))
+    await asyncio.sleep(0)
+    assert breaker.state == "half_open"
+    
+    early.cancel()
+    await asyncio.gather(early, return_exceptions=True)
+    assert breaker.allow() is None
+    
+    client.pending[1].set_result("A lighthouse at dusk")
+    await probe
+    assert breaker.state == "closed"
+
+
+def enhancement_count(style: str, source: str) -> float:
+    return REGISTRY.get_sample_value(
+        "prompt_enhancement_seconds_count", {"style": style, "source": source}
+    ) or 0
+
+
+async def test_packed_enhancement_is_timed_per_scene(breaker):
+    client = FakeClient()
+    items = [
+        {"description": "A lighthouse on a cliff", "style": "noir"},
+        {"description": "A quiet harbor at dawn", "style": "noir"},
+    ]
+    before = enhancement_count("noir", "llm")
+    
+    packed = asyncio.create_task(prompt_engineer._enhance_packed(client, items))
+    while not client.pending:
+        await asyncio.sleep(0)
+    client.pending[0].set_result('{"prompts": ["A lighthouse", "A harbor"]}')
+    await packed
+    
+    assert enhancement_count("noir", "llm") == before + 2
+
+
+async def test_packed_fallback_is_timed_as_template(breaker):
+    breaker.opened_at = time.monotonic()
+    items = [
+        {"description": "A lighthouse on a cliff", "style": "sketch"},
+        {"description": "A quiet harbor at dawn", "style": "sketch"},
+    ]
+    before = enhancement_count("sketch", "template")
+    
+    await prompt_engineer._enhance_packed(FakeClient(), items)
+    
+    assert enhancement_count("sketch", "template") == before + 2
@@ -0,0 +1,204 @@
+"""
+Queue manager tests against an in-process fakeredis server
+"""
+
+import asyncio
+
+import fakeredis
+import pytest
+
+from config import settings
+from services.queue_manager import STARTABLE_STATUSES, QueueManager, is_final, scene_key
+
+
+@pytest.fixture
+async def manager():
+    server = fakeredis.FakeServer()
+    manager = QueueManager()
+    manager.redis = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    manager.events._client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    manager._register_scripts()
+    yield manager
+    await manager.events.close()
+    await manager.redis.aclose()
+
+
+def scene_job(**fields) -> dict:
+    return {
+        "scene_id": "scene-1",
+        "project_id": "project-1",
+        "prompt": "A lighthouse on a cliff at dusk",
+        **fields,
+    }
+
+
+async def test_requeue_supersedes_previous_queued_job(manager):
+    first = await manager.queue_generation_job(scene_job())
+    second = await manager.queue_generation_job(scene_job())
+    
+    superseded = await manager.get_job_status(first)
+    assert superseded["status"] == "superseded"
+    assert superseded["superseded_by"] == second
+    assert (await manager.get_job_status(second))["status"] == "queued"
+    assert await manager.redis.get(scene_key(scene_job())) == second
+
+
+async def test_requeue_in_one_batch_keeps_only_the_last_job(manager):
+    first, second, third = await manager.queue_generation_jobs([scene_job()] * 3)
+    
+    assert (await manager.get_job_status(first))["status"] == "superseded"
+    assert (await manager.get_job_status(second))["status"] == "superseded"
+    assert (await manager.get_job_status(third))["status"] == "queued"
+
+
+async def test_requeue_leaves_started_job_alone(manager):
+    first = await manager.queue_generation_job(scene_job())
+    await manager.update_job_status(first, "processing")
+    second = await manager.queue_generation_job(scene_job())
+    
+    assert (await manager.get_job_status(first))["status"] == "processing"
+    assert await manager.redis.get(scene_key(scene_job())) == second
+
+
+async def test_worker_skips_superseded_job(manager):
+    first = await manager.queue_generation_job(scene_job())
+    second = await manager.queue_generation_job(scene_job())
+    
+    job = await manager.dequeue_job("worker-1")
+    assert job["id"] == first
+    assert await manager.skip_if_superseded(job)
+    
+    job = await manager.dequeue_job("worker-1")
+    assert job["id"] == second
+    assert not await manager.skip_if_superseded(job)
+
+
+def tenant_job(tenant: str, lane: str = "interactive") -> dict:
+    return {"user_id": tenant, "priority": lane, "prompt": "A quiet harbor at dawn"}
+
+
+async def test_dispatch_round_robins_tenants_within_a_lane(manager):
+    await manager.queue_generation_jobs([tenant_job("alice")] * 3)
+    await manager.queue_generation_jobs([tenant_job("bob")] * 3)
+    
+    tenants = [(await manager.dequeue_job())["user_id"] for _ in range(6)]
+    assert tenants == ["alice", "bob"] * 3
+
+
+async def test_dispatch_weights_interactive_lane_over_bulk(manager, monkeypatch):
+    monkeypatch.setattr(settings, "interactive_lane_weight", 4)
+    await manager.queue_generation_jobs([tenant_job("alice", "bulk")] * 10)
+    await manager.queue_generation_jobs([tenant_job("bob")] * 10)
+    
+    lanes = [(await manager.dequeue_job())["priority"] for _ in range(10)]
+    assert lanes.count("interactive") == 8
+    assert lanes.count("bulk") == 2
+
+
+async def test_requeuing_tenant_keeps_its_turn(manager):
+    for tenant in ("a", "b", "c", "d", "e"):
+        await manager.queue_generation_jobs([tenant_job(tenant)] * 40)
+    
+    dispatched = []
+    for turn in range(120):
+        if turn % 3 == 0:
+            await manager.queue_generation_job(tenant_job("f"))
+        dispatched.append((await manager.dequeue_job())["user_id"])
+    
+    # Six tenants share the lane, so "f" gets about one dispatch in six
+    assert dispatched.count("f") >= 120 // 6 - 1
+
+
+async def test_retry_wakes_blocked_worker_when_due(manager):
+    job = {"id": "job-1", "status": "processing", "prompt": "A quiet harbor at dawn"}
+    
+    async def next_job():
+        while True:
+            dequeued = await manager.dequeue_job()
+            if dequeued:
+                return dequeued
+    
+    # The worker is already blocked on an empty queue when the retry arrives
+    waiting = asyncio.create_task(next_job())
+    await asyncio.sleep(0.05)
+    await manager.retry_job(job, delay=0.2)
+    
+    retried = await asyncio.wait_for(waiting, timeout=2)
+    assert retried["id"] == "job-1"
+    assert retried["retries"] == 1
+
+
+async def test_claim_recreates_expired_job_record(manager):
+    job_id = await manager.queue_generation_job(scene_job())
+    await manager.redis.delete(f"job:{job_id}")
+    
+    job = await manager.dequeue_job("worker-1")
+    claimed = await manager.update_job_status(
+        job_id, "processing", expected_status=STARTABLE_STATUSES, fallback=job
+    )
+    
+    assert claimed["status"] == "processing"
+    assert claimed["prompt"] == job["prompt"]
+    assert (await manager.get_job_status(job_id))["status"] == "processing"
+
+
+async def test_claim_still_refuses_superseded_job(manager):
+    first = await manager.queue_generation_job(scene_job())
+    await manager.queue_generation_job(scene_job())
+    
+    job = await manager.dequeue_job("worker-1")
+    claimed = await manager.update_job_status(
+        first, "processing", expected_status=STARTABLE_STATUSES, fallback=job
+    )
+    
+    assert claimed is None
+    assert (await manager.get_job_status(first))["status"] == "superseded"
+
+
+async def test_promoted_retries_return_to_their_lane(manager, monkeypatch):
+    monkeypatch.setattr(settings, "interactive_lane_weight", 4)
+    await manager.queue_generation_jobs([tenant_job("alice")] * 3)
+    for i in range(20):
+        retry = {**tenant_job("storyboard", "bulk"), "id": f"retry-{i}"}
+        await manager.retry_job(retry, delay=0)
+    assert await manager.promote_delayed_jobs() == 20
+    
+    jobs = [await manager.dequeue_job() for _ in range(23)]
+    assert [job["priority"] for job in jobs[:4]] == ["interactive"] * 3 + ["bulk"]
+    # Retries keep their order within the tenant's queue
+    assert [job["id"] for job in jobs[3:]] == [f"retry-{i}" for i in range(20)]
+
+
+async def test_completed_job_waits_for_its_chained_upscale(manager):
+    job_id = await manager.queue_generation_job(scene_job(upscale=True))
+    await manager.update_job_status(job_id, "completed", upscale_job_id="upscale-1")
+    
+    waiting = asyncio.create_task(
+        manager.wait_for_job_update(job_id, since="completed", timeout=2)
+    )
+    await asyncio.sleep(0.05)
+    assert not waiting.done()
+    assert job_id not in manager._job_cache
+    
+    await manager.update_job_status(job_id, "completed", upscaled_url="https://cdn/up.png")
+    job = await asyncio.wait_for(waiting, timeout=1)
+    assert job["upscaled_url"] == "https://cdn/up.png"
+    assert is_final(job)
+
+
+async def test_job_stream_stays_open_until_upscale_lands(manager):
+    job_id = await manager.queue_generation_job(scene_job(upscale=True))
+    await manager.update_job_status(job_id, "completed", upscale_job_id="upscale-1")
+    
+    async def follow():
+        return [
+            job["upscaled_url"] if job.get("upscaled_url") else job["status"]
+            async for job in manager.stream_job_events(job_ids=[job_id], heartbeat=1)
+            if job
+        ]
+    
+    streaming = asyncio.create_task(follow())
+    await asyncio.sleep(0.05)
+    await manager.update_job_status(job_id, "completed", upscaled_url="https://cdn/up.png")
+    
+    assert await asyncio.wait_for(streaming, timeout=2) == ["completed", "https://cdn/up.png"]